@@ -1,536 +1,3795 @@
-# pychess_lite.py
-import random
-import json
-
-# Constants for board indices
-PLAYER_TO_MOVE = 64
-CASTLING_RIGHTS_KINGSIDE_WHITE = 65
-CASTLING_RIGHTS_QUEENSIDE_WHITE = 66
-CASTLING_RIGHTS_KINGSIDE_BLACK = 67
-CASTLING_RIGHTS_QUEENSIDE_BLACK = 68
-EN_PASSANT = 69
-HALF_MOVE_CLOCK = 70
-
-class Board:
-    def __init__(self):
-        self._initialize_zobrist()
-        self.position_hash_counts = {}
-        self.board = None
-        self.position_hash = 0
-
-    @classmethod
-    def new(cls):
-        instance = cls()
-        instance._initialize_new_game()
-        return instance
-
-    @classmethod
-    def load(cls, filename):
-        instance = cls()
-        instance._load_from_file(filename)
-        return instance
-
-    def _initialize_new_game(self):
-        self.board = (
-            ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r'] +
-            ['p'] * 8 +
-            [' '] * 32 +
-            ['P'] * 8 +
-            ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R'] +
-            ['w'] + [True, True, True, True] + [None] + [0]
-        )
-        self.position_hash = self._hash()
-        self.position_hash_counts = {self.position_hash: 1}
-
-    def _load_from_file(self, filename):
-        with open(filename, 'r') as f:
-            data = json.load(f)
-        self.board = data['board']
-        self.position_hash = data['position_hash']
-        self.position_hash_counts = data['position_hash_counts']
-
-    def save(self, filename):
-        data = {
-            'board': self.board,
-            'position_hash': self.position_hash,
-            'position_hash_counts': self.position_hash_counts
-        }
-        with open(filename, 'w') as f:
-            json.dump(data, f)
-
-    def _initialize_zobrist(self):
-        self.zobrist_table = {}
-        pieces = ['P', 'N', 'B', 'R', 'Q', 'K',
-                  'p', 'n', 'b', 'r', 'q', 'k']
-        self.zobrist_piece = {}
-        random.seed(125104875299311)
-        for piece in pieces:
-            self.zobrist_piece[piece] = [random.getrandbits(64) for _ in range(64)]
-        self.zobrist_side = random.getrandbits(64)
-        self.zobrist_castling = {
-            'K': random.getrandbits(64),
-            'Q': random.getrandbits(64),
-            'k': random.getrandbits(64),
-            'q': random.getrandbits(64)
-        }
-        self.zobrist_en_passant = [random.getrandbits(64) for _ in range(8)]
-
-    def _hash(self):
-        h = 0
-        for index in range(64):
-            piece = self.board[index]
-            if piece != ' ':
-                h ^= self.zobrist_piece[piece][index]
-        if self.board[PLAYER_TO_MOVE] == 'w':
-            h ^= self.zobrist_side
-        if self.board[CASTLING_RIGHTS_KINGSIDE_WHITE]:
-            h ^= self.zobrist_castling['K']
-        if self.board[CASTLING_RIGHTS_QUEENSIDE_WHITE]:
-            h ^= self.zobrist_castling['Q']
-        if self.board[CASTLING_RIGHTS_KINGSIDE_BLACK]:
-            h ^= self.zobrist_castling['k']
-        if self.board[CASTLING_RIGHTS_QUEENSIDE_BLACK]:
-            h ^= self.zobrist_castling['q']
-        if self.board[EN_PASSANT] is not None:
-            target_square = self.board[EN_PASSANT]
-            file = ord(target_square[0]) - ord('a')
-            h ^= self.zobrist_en_passant[file]
-        return h
-    
-    def player_to_move(self):
-        return self.board[PLAYER_TO_MOVE]
-
-    def white_to_move(self):
-        return self.player_to_move() == 'w'
-
-    def black_to_move(self):
-        return self.player_to_move() == 'b'
-
-    def legal_moves(self):
-        if self.board is None:
-            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
-        turn = self.player_to_move()
-        legal_moves = []
-        starting_coordinates = [
-            i for i, piece in enumerate(self.board[:64])
-            if (turn == 'w' and piece.isupper()) or (turn == 'b' and piece.islower())
-        ]
-        opponent_moves = self.dangerous_squares()
-        en_passant_move = self.board[EN_PASSANT]
-        en_passant_target = self._en_passant_target_index()
-        for start in starting_coordinates:
-            piece = self.board[start]
-            if piece.upper() == 'P':
-                direction = -1 if piece.isupper() else 1
-                forward_one = start + (direction * 8)
-                if 0 <= forward_one < 64 and self.board[forward_one] == ' ':
-                    if (piece.isupper() and forward_one < 8) or (piece.islower() and forward_one >= 56):
-                        for promo_piece in ['Q', 'R', 'B', 'N']:
-                            promo = promo_piece.lower() if piece.islower() else promo_piece
-                            legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(forward_one)}{promo}')
-                    else:
-                        legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(forward_one)}')
-                    starting_rank = 6 if piece.isupper() else 1
-                    if (start // 8 == starting_rank):
-                        forward_two = start + (direction * 16)
-                        if self.board[forward_two] == ' ' and self.board[forward_one] == ' ':
-                            legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(forward_two)}')
-                for dx in [-1, 1]:
-                    x = (start % 8) + dx
-                    y = (start // 8) + direction
-                    if 0 <= x < 8 and 0 <= y < 8:
-                        target = y * 8 + x
-                        target_piece = self.board[target]
-                        if target_piece != ' ' and (target_piece.islower() if piece.isupper() else target_piece.isupper()):
-                            if (piece.isupper() and target < 8) or (piece.islower() and target >= 56):
-                                for promo_piece in ['Q', 'R', 'B', 'N']:
-                                    promo = promo_piece.lower() if piece.islower() else promo_piece
-                                    legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(target)}{promo}')
-                            else:
-                                legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(target)}')
-                        elif self.index_to_square(target) == en_passant_move:
-                            legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(target)}')
-            elif piece.upper() == 'N':
-                knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                                (1, -2), (1, 2), (2, -1), (2, 1)]
-                x = start % 8
-                y = start // 8
-                for dx, dy in knight_moves:
-                    nx = x + dx
-                    ny = y + dy
-                    if 0 <= nx < 8 and 0 <= ny < 8:
-                        target = ny * 8 + nx
-                        target_piece = self.board[target]
-                        if target_piece == ' ' or (
-                            target_piece.islower() if piece.isupper() else target_piece.isupper()
-                        ):
-                            legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(target)}')
-            elif piece.upper() in ['B', 'R', 'Q']:
-                directions = []
-                if piece.upper() == 'B':
-                    directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-                elif piece.upper() == 'R':
-                    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-                elif piece.upper() == 'Q':
-                    directions = [(-1, -1), (-1, 1), (1, -1), (1, 1),
-                                  (-1, 0), (1, 0), (0, -1), (0, 1)]
-                x = start % 8
-                y = start // 8
-                for dx, dy in directions:
-                    nx, ny = x + dx, y + dy
-                    while 0 <= nx < 8 and 0 <= ny < 8:
-                        target = ny * 8 + nx
-                        target_piece = self.board[target]
-                        legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(target)}')
-                        if target_piece == ' ':
-                            pass
-                        elif (target_piece.islower() if piece.isupper() else target_piece.isupper()):
-                            break
-                        else:
-                            break
-                        nx += dx
-                        ny += dy
-            elif piece.upper() == 'K':
-                x = start % 8
-                y = start // 8
-                for dx, dy in [(-1, -1), (-1, 1), (1, -1), (1, 1),
-                               (-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < 8 and 0 <= ny < 8:
-                        target = ny * 8 + nx
-                        target_piece = self.board[target]
-                        if (target_piece == ' ' or
-                            (target_piece.islower() if piece.isupper() else target_piece.isupper())):
-                            target_square = self.index_to_square(target)
-                            if target_square not in opponent_moves:
-                                legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(target)}')
-                rights = self.castling_rights()
-                king_side_square = start + 2
-                queen_side_square = start - 2
-                if rights['king_side']:
-                    legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(king_side_square)}')
-                if rights['queen_side']:
-                    legal_moves.append(f'{self.index_to_square(start)}{self.index_to_square(queen_side_square)}')
-        safe_moves = []
-        for move in legal_moves:
-            temp_board = self.board.copy()
-            temp_hash = self.position_hash
-            self.move(move, test=True, temp_board=temp_board)
-            original_board = self.board
-            self.board = temp_board
-            if not self.check():
-                safe_moves.append(move)
-            self.board = original_board
-            self.position_hash = temp_hash
-        return safe_moves
-
-    def check(self):
-        king_char = 'K' if self.white_to_move() else 'k'
-        try:
-            king_pos = self.board.index(king_char)
-        except ValueError:
-            return True
-        king_square = self.index_to_square(king_pos)
-        opponent_moves = self.dangerous_squares()
-        return king_square in opponent_moves
-
-    def castling_rights(self):
-        rights = {'king_side': False, 'queen_side': False}
-        king_char = 'K' if self.white_to_move() else 'k'
-        try:
-            king_pos = self.board.index(king_char)
-        except ValueError:
-            return rights
-        opponent_moves = self.dangerous_squares()
-        king_square = self.index_to_square(king_pos)
-        if self.player_to_move() == 'w':
-            if self.board[CASTLING_RIGHTS_KINGSIDE_WHITE]:
-                if self.board[63] == 'R':
-                    if self.board[61] == ' ' and self.board[62] == ' ':
-                        if (king_square not in opponent_moves and
-                            self.index_to_square(king_pos + 1) not in opponent_moves and
-                            self.index_to_square(king_pos + 2) not in opponent_moves):
-                            rights['king_side'] = True
-            if self.board[CASTLING_RIGHTS_QUEENSIDE_WHITE]:
-                if self.board[56] == 'R':
-                    if self.board[57] == ' ' and self.board[58] == ' ' and self.board[59] == ' ':
-                        if (king_square not in opponent_moves and
-                            self.index_to_square(king_pos - 1) not in opponent_moves and
-                            self.index_to_square(king_pos - 2) not in opponent_moves):
-                            rights['queen_side'] = True
-        else:
-            if self.board[CASTLING_RIGHTS_KINGSIDE_BLACK]:
-                if self.board[7] == 'r':
-                    if self.board[5] == ' ' and self.board[6] == ' ':
-                        if (king_square not in opponent_moves and
-                            self.index_to_square(king_pos + 1) not in opponent_moves and
-                            self.index_to_square(king_pos + 2) not in opponent_moves):
-                            rights['king_side'] = True
-            if self.board[CASTLING_RIGHTS_QUEENSIDE_BLACK]:
-                if self.board[0] == 'r':
-                    if self.board[1] == ' ' and self.board[2] == ' ' and self.board[3] == ' ':
-                        if (king_square not in opponent_moves and
-                            self.index_to_square(king_pos - 1) not in opponent_moves and
-                            self.index_to_square(king_pos - 2) not in opponent_moves):
-                            rights['queen_side'] = True
-        return rights
-
-    def move(self, move, test=False, temp_board=None):
-        board = temp_board if temp_board is not None else self.board
-        start, end = move[:2], move[2:4]
-        promotion_piece = move[4] if len(move) > 4 else ''
-        start_index = self.square_to_index(start)
-        end_index = self.square_to_index(end)
-        moving_piece = board[start_index]
-        target_piece = board[end_index]
-        if not test and move not in self.legal_moves():
-            raise ValueError(f"Illegal move: {move}")
-        if moving_piece.upper() == 'K' and abs(start_index - end_index) == 2:
-            if end_index > start_index:
-                rook_start = start_index + 3
-                rook_end = start_index + 1
-            else:
-                rook_start = start_index - 4
-                rook_end = start_index - 1
-            rook_piece = board[rook_start]
-            board[start_index] = ' '
-            board[end_index] = moving_piece
-            board[rook_start] = ' '
-            board[rook_end] = rook_piece
-            if moving_piece.isupper():
-                board[CASTLING_RIGHTS_KINGSIDE_WHITE] = False  
-                board[CASTLING_RIGHTS_QUEENSIDE_WHITE] = False  
-            else:
-                board[CASTLING_RIGHTS_KINGSIDE_BLACK] = False  
-                board[CASTLING_RIGHTS_QUEENSIDE_BLACK] = False  
-            if not test:
-                self.position_hash ^= self.zobrist_piece[moving_piece][start_index]
-                self.position_hash ^= self.zobrist_piece[rook_piece][rook_start]
-                self.position_hash ^= self.zobrist_piece[moving_piece][end_index]
-                self.position_hash ^= self.zobrist_piece[rook_piece][rook_end]
-                if moving_piece.isupper():
-                    if board[CASTLING_RIGHTS_KINGSIDE_WHITE]:
-                        self.position_hash ^= self.zobrist_castling['K']
-                        board[CASTLING_RIGHTS_KINGSIDE_WHITE] = False
-                    if board[CASTLING_RIGHTS_QUEENSIDE_WHITE]:
-                        self.position_hash ^= self.zobrist_castling['Q']
-                        board[CASTLING_RIGHTS_QUEENSIDE_WHITE] = False
-                else:
-                    if board[CASTLING_RIGHTS_KINGSIDE_BLACK]:
-                        self.position_hash ^= self.zobrist_castling['k']
-                        board[CASTLING_RIGHTS_KINGSIDE_BLACK] = False
-                    if board[CASTLING_RIGHTS_QUEENSIDE_BLACK]:
-                        self.position_hash ^= self.zobrist_castling['q']
-                        board[CASTLING_RIGHTS_QUEENSIDE_BLACK] = False
-        else:
-            en_passant_move = board[EN_PASSANT]
-            en_passant_target = self._en_passant_target_index()
-            if moving_piece.upper() == 'P' and end_index == en_passant_target:
-                if moving_piece.isupper():
-                    capture_index = end_index + 8
-                else:
-                    capture_index = end_index - 8
-                captured_pawn = board[capture_index]
-                if captured_pawn.upper() != 'P':
-                    raise ValueError(f"En passant capture failed: No pawn to capture at {self.index_to_square(capture_index)}")
-                board[capture_index] = ' '
-                if not test:
-                    self.position_hash ^= self.zobrist_piece[captured_pawn][capture_index]
-            board[start_index] = ' '
-            if promotion_piece:
-                promoted_piece = promotion_piece.upper() if moving_piece.isupper() else promotion_piece.lower()
-                board[end_index] = promoted_piece
-            else:
-                board[end_index] = moving_piece
-            if moving_piece.upper() == 'R':
-                if moving_piece.isupper():
-                    if start_index == 56:
-                        if board[CASTLING_RIGHTS_QUEENSIDE_WHITE]:
-                            if not test:
-                                self.position_hash ^= self.zobrist_castling['Q']
-                            board[CASTLING_RIGHTS_QUEENSIDE_WHITE] = False
-                    elif start_index == 63:
-                        if board[CASTLING_RIGHTS_KINGSIDE_WHITE]:
-                            if not test:
-                                self.position_hash ^= self.zobrist_castling['K']
-                            board[CASTLING_RIGHTS_KINGSIDE_WHITE] = False
-                else:
-                    if start_index == 0:
-                        if board[CASTLING_RIGHTS_QUEENSIDE_BLACK]:
-                            if not test:
-                                self.position_hash ^= self.zobrist_castling['q']
-                            board[CASTLING_RIGHTS_QUEENSIDE_BLACK] = False
-                    elif start_index == 7:
-                        if board[CASTLING_RIGHTS_KINGSIDE_BLACK]:
-                            if not test:
-                                self.position_hash ^= self.zobrist_castling['k']
-                            board[CASTLING_RIGHTS_KINGSIDE_BLACK] = False
-            if moving_piece.upper() == 'P' and abs(start_index - end_index) == 16:
-                if moving_piece.isupper():
-                    to_square = self.index_to_square(start_index - 8)
-                else:
-                    to_square = self.index_to_square(start_index + 8)
-                if not test and board[EN_PASSANT] is not None:
-                    previous_target = board[EN_PASSANT]
-                    previous_file = ord(previous_target[0]) - ord('a')
-                    self.position_hash ^= self.zobrist_en_passant[previous_file]
-                board[EN_PASSANT] = to_square
-                if not test:
-                    file = ord(to_square[0]) - ord('a')
-                    self.position_hash ^= self.zobrist_en_passant[file]
-            else:
-                if not test and board[EN_PASSANT] is not None:
-                    previous_target = board[EN_PASSANT]
-                    previous_file = ord(previous_target[0]) - ord('a')
-                    self.position_hash ^= self.zobrist_en_passant[previous_file]
-                board[EN_PASSANT] = None
-            if not test:
-                self.position_hash ^= self.zobrist_piece[moving_piece][start_index]
-                if target_piece != ' ' and not (moving_piece.upper() == 'P' and end_index == en_passant_target):
-                    self.position_hash ^= self.zobrist_piece[target_piece][end_index]
-                self.position_hash ^= self.zobrist_piece[board[end_index]][end_index]
-                if moving_piece.upper() == 'K':
-                    if moving_piece.isupper():
-                        if board[CASTLING_RIGHTS_KINGSIDE_WHITE]:
-                            self.position_hash ^= self.zobrist_castling['K']
-                            board[CASTLING_RIGHTS_KINGSIDE_WHITE] = False
-                        if board[CASTLING_RIGHTS_QUEENSIDE_WHITE]:
-                            self.position_hash ^= self.zobrist_castling['Q']
-                            board[CASTLING_RIGHTS_QUEENSIDE_WHITE] = False
-                    else:
-                        if board[CASTLING_RIGHTS_KINGSIDE_BLACK]:
-                            self.position_hash ^= self.zobrist_castling['k']
-                            board[CASTLING_RIGHTS_KINGSIDE_BLACK] = False
-                        if board[CASTLING_RIGHTS_QUEENSIDE_BLACK]:
-                            self.position_hash ^= self.zobrist_castling['q']
-                            board[CASTLING_RIGHTS_QUEENSIDE_BLACK] = False
-        if not test:
-            if moving_piece.upper() == 'P' or target_piece != ' ' or promotion_piece:
-                board[HALF_MOVE_CLOCK] = 0
-            else:
-                board[HALF_MOVE_CLOCK] += 1
-            board[PLAYER_TO_MOVE] = 'b' if board[PLAYER_TO_MOVE] == 'w' else 'w'
-            self.position_hash ^= self.zobrist_side
-            count = self.position_hash_counts.get(self.position_hash, 0)
-            self.position_hash_counts[self.position_hash] = count + 1
-
-        return board
-
-    def square_to_index(self, square):
-        file = ord(square[0]) - ord('a')
-        rank = 8 - int(square[1])
-        return rank * 8 + file
-
-    def index_to_square(self, index):
-        file = index % 8
-        rank = 8 - (index // 8)
-        return f'{chr(file + ord("a"))}{rank}'
-
-    def dangerous_squares(self):
-        opponent_moves = set()
-        opponent_turn = 'b' if self.player_to_move() == 'w' else 'w'
-        starting_coordinates = [
-            i for i, piece in enumerate(self.board[:64])
-            if (opponent_turn == 'w' and piece.isupper()) or (opponent_turn == 'b' and piece.islower())
-        ]
-        for start in starting_coordinates:
-            piece = self.board[start]
-            if piece.upper() == 'P':
-                direction = -1 if piece.isupper() else 1
-                for dx in [-1, 1]:
-                    x = (start % 8) + dx
-                    y = (start // 8) + direction
-                    if 0 <= x < 8 and 0 <= y < 8:
-                        target_square = self.index_to_square(y * 8 + x)
-                        opponent_moves.add(target_square)
-            elif piece.upper() == 'N':
-                knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), 
-                                (1, -2), (1, 2), (2, -1), (2, 1)]
-                x = start % 8
-                y = start // 8
-                for dx, dy in knight_moves:
-                    nx = x + dx
-                    ny = y + dy
-                    if 0 <= nx < 8 and 0 <= ny < 8:
-                        target_square = self.index_to_square(ny * 8 + nx)
-                        opponent_moves.add(target_square)
-            elif piece.upper() in ['B', 'R', 'Q']:
-                directions = []
-                if piece.upper() == 'B':
-                    directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-                elif piece.upper() == 'R':
-                    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-                elif piece.upper() == 'Q':
-                    directions = [(-1, -1), (-1, 1), (1, -1), (1, 1), 
-                                  (-1, 0), (1, 0), (0, -1), (0, 1)]
-                x = start % 8
-                y = start // 8
-                for dx, dy in directions:
-                    nx, ny = x + dx, y + dy
-                    while 0 <= nx < 8 and 0 <= ny < 8:
-                        target = ny * 8 + nx
-                        target_square = self.index_to_square(target)
-                        opponent_moves.add(target_square)
-                        if self.board[target] != ' ':
-                            break
-                        nx += dx
-                        ny += dy
-            elif piece.upper() == 'K':
-                x = start % 8
-                y = start // 8
-                for dx, dy in [(-1, -1), (-1, 1), (1, -1), (1, 1), 
-                               (-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < 8 and 0 <= ny < 8:
-                        target_square = self.index_to_square(ny * 8 + nx)
-                        opponent_moves.add(target_square)
-        return opponent_moves
-
-    def insufficient_material(self):
-        white_pieces = []
-        black_pieces = []
-        for index, piece in enumerate(self.board[:64]):
-            if piece == ' ' or piece.upper() == 'K':
-                continue
-            if piece.isupper():
-                white_pieces.append((piece, index))
-            else:
-                black_pieces.append((piece, index))
-        minor_pieces = ['N', 'B']
-        if not white_pieces and not black_pieces:
-            return True
-        if (len(white_pieces) == 1 and white_pieces[0][0].upper() in minor_pieces and not black_pieces) or \
-           (len(black_pieces) == 1 and black_pieces[0][0].upper() in minor_pieces and not white_pieces):
-            return True
-        if len(white_pieces) == 1 and len(black_pieces) == 1:
-            if white_pieces[0][0].upper() == 'B' and black_pieces[0][0].upper() == 'B':
-                white_square_color = (white_pieces[0][1] // 8 + white_pieces[0][1] % 8) % 2
-                black_square_color = (black_pieces[0][1] // 8 + black_pieces[0][1] % 8) % 2
-                if white_square_color == black_square_color:
-                    return True
-        return False
-
-    def fifty_move_rule(self):
-        return self.board[HALF_MOVE_CLOCK] >= 100
-
-    def stalemate(self):
-        if not self.legal_moves():
-            return not self.check()
-        return False
-
-    def three_fold_repetition(self):
-        return self.position_hash_counts.get(self.position_hash, 0) >= 3
-
-    def checkmate(self):
-        if self.check():
-            return not self.legal_moves()
-        return False
-
-    def en_passant(self):
-        return self.board[EN_PASSANT]
-
-    def _en_passant_target_index(self):
-        if self.board[EN_PASSANT] is None:
-            return -1
-        target_square = self.board[EN_PASSANT]
-        return self.square_to_index(target_square)
+# pychess_lite.py
+import argparse
+import asyncio
+import heapq
+import os
+import random
+import json
+import mmap
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import uuid
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the batch array exports
+    np = None
+
+# Constants for board indices
+PLAYER_TO_MOVE = 64
+CASTLING_RIGHTS_KINGSIDE_WHITE = 65
+CASTLING_RIGHTS_QUEENSIDE_WHITE = 66
+CASTLING_RIGHTS_KINGSIDE_BLACK = 67
+CASTLING_RIGHTS_QUEENSIDE_BLACK = 68
+EN_PASSANT = 69
+HALF_MOVE_CLOCK = 70
+
+# Constants for bitboards
+WHITE = 0
+BLACK = 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECES = 'PNBRQKpnbrqk'
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECES)}
+SQUARE_NAMES = [f'{chr(index % 8 + ord("a"))}{8 - index // 8}' for index in range(64)]
+SQUARE_INDEX = {square: index for index, square in enumerate(SQUARE_NAMES)}
+FULL_BOARD = (1 << 64) - 1
+FILE_A = sum(1 << (rank * 8) for rank in range(8))
+FILE_H = FILE_A << 7
+RANK_8 = 0xFF
+RANK_1 = RANK_8 << 56
+RANK_3 = RANK_8 << 40
+RANK_6 = RANK_8 << 16
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                  (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_OFFSETS = [(-1, -1), (-1, 1), (1, -1), (1, 1),
+                (-1, 0), (1, 0), (0, -1), (0, 1)]
+CASTLING_FLAGS_BY_SQUARE = {
+    0: (CASTLING_RIGHTS_QUEENSIDE_BLACK,),
+    4: (CASTLING_RIGHTS_KINGSIDE_BLACK, CASTLING_RIGHTS_QUEENSIDE_BLACK),
+    7: (CASTLING_RIGHTS_KINGSIDE_BLACK,),
+    56: (CASTLING_RIGHTS_QUEENSIDE_WHITE,),
+    60: (CASTLING_RIGHTS_KINGSIDE_WHITE, CASTLING_RIGHTS_QUEENSIDE_WHITE),
+    63: (CASTLING_RIGHTS_KINGSIDE_WHITE,),
+}
+
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+PGN_RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+PGN_TAG_PATTERN = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+PGN_RESULT_PATTERN = re.compile(r'(?:^|\s)(?:1-0|0-1|1/2-1/2|\*)\s*$')
+PGN_TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|[^\s(){};$]+')
+COORDINATE_MOVE_PATTERN = re.compile(r'^[a-h][1-8][a-h][1-8][NBRQnbrq]?$')
+PGN_MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.*')
+FEN_PIECES = frozenset(PIECES + ' ')
+FEN_EXPANSION = str.maketrans({str(count): ' ' * count for count in range(1, 9)})
+# The king and rook, with their home squares, that each castling letter needs
+FEN_CASTLING_SQUARES = {'K': ('K', 60, 'R', 63), 'Q': ('K', 60, 'R', 56), 'k': ('k', 4, 'r', 7), 'q': ('k', 4, 'r', 0)}
+FEN_COMPRESSION = [(' ' * count, str(count)) for count in range(8, 0, -1)]
+
+# Constants for the binary formats. A position record holds the position
+# hash, the 64 squares packed as nibbles (0 empty, 1-12 PIECES), flags (bit 0
+# black to move, bits 1-4 castling rights KQkq), en passant index + 1 (0 for
+# none), half-move clock and full-move number.
+POSITION_RECORD = struct.Struct('<Q32sBBHH2x')
+# Bytes of a record that identify the position itself, leaving out the clocks
+POSITION_KEY_SIZE = struct.calcsize('<Q32sBB')
+FILE_HEADER = struct.Struct('<4sHH8x')
+REPETITION_ENTRY = struct.Struct('<QI')
+FILE_FORMAT_VERSION = 1
+GAME_FILE_MAGIC = b'PCLG'
+STORE_FILE_MAGIC = b'PCLS'
+PIECE_NIBBLES = {piece: nibble for nibble, piece in enumerate(' ' + PIECES)}
+NIBBLE_PAIRS = [(' ' + PIECES + '???')[pair >> 4] + (' ' + PIECES + '???')[pair & 15] for pair in range(256)]
+
+# Constants for search. Scores are in centipawns from the point of view of
+# the player to move; a mate in n plies scores MATE_SCORE - n.
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+ORDERING_VALUES = {piece: PIECE_VALUES[index % 6] // 10 for index, piece in enumerate(PIECES)}
+ORDERING_VALUES.update({'K': 100, 'k': 100, ' ': 0})
+MATE_SCORE = 100000
+INFINITE_SCORE = 1000000
+MAX_SEARCH_PLY = 64
+DEFAULT_SEARCH_DEPTH = 4
+EXACT_BOUND, LOWER_BOUND, UPPER_BOUND = range(3)
+
+# Constants for evaluation: material and piece-square tables for the
+# middlegame and the endgame, indexed by square from White's side (0 = a8).
+# The two scores are blended by the game phase, which counts 1 for each
+# minor piece, 2 for each rook and 4 for each queen on the board.
+MIDDLEGAME_VALUES = (82, 337, 365, 477, 1025, 0)
+ENDGAME_VALUES = (94, 281, 297, 512, 936, 0)
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+MIDDLEGAME_TABLES = (
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     98, 134, 61, 95, 68, 126, 34, -11,
+     -6, 7, 26, 31, 65, 56, 25, -20,
+     -14, 13, 6, 21, 23, 12, 17, -23,
+     -27, -2, -5, 12, 17, 6, 10, -25,
+     -26, -4, -4, -10, 3, 3, 33, -12,
+     -35, -1, -20, -23, -15, 24, 38, -22,
+     0, 0, 0, 0, 0, 0, 0, 0),
+    (-167, -89, -34, -49, 61, -97, -15, -107,
+     -73, -41, 72, 36, 23, 62, 7, -17,
+     -47, 60, 37, 65, 84, 129, 73, 44,
+     -9, 17, 19, 53, 37, 69, 18, 22,
+     -13, 4, 16, 13, 28, 19, 21, -8,
+     -23, -9, 12, 10, 19, 17, 25, -16,
+     -29, -53, -12, -3, -1, 18, -14, -19,
+     -105, -21, -58, -33, -17, -28, -19, -23),
+    (-29, 4, -82, -37, -25, -42, 7, -8,
+     -26, 16, -18, -13, 30, 59, 18, -47,
+     -16, 37, 43, 40, 35, 50, 37, -2,
+     -4, 5, 19, 50, 37, 37, 7, -2,
+     -6, 13, 13, 26, 34, 12, 10, 4,
+     0, 15, 15, 15, 14, 27, 18, 10,
+     4, 15, 16, 0, 7, 21, 33, 1,
+     -33, -3, -14, -21, -13, -12, -39, -21),
+    (32, 42, 32, 51, 63, 9, 31, 43,
+     27, 32, 58, 62, 80, 67, 26, 44,
+     -5, 19, 26, 36, 17, 45, 61, 16,
+     -24, -11, 7, 26, 24, 35, -8, -20,
+     -36, -26, -12, -1, 9, -7, 6, -23,
+     -45, -25, -16, -17, 3, 0, -5, -33,
+     -44, -16, -20, -9, -1, 11, -6, -71,
+     -19, -13, 1, 17, 16, 7, -37, -26),
+    (-28, 0, 29, 12, 59, 44, 43, 45,
+     -24, -39, -5, 1, -16, 57, 28, 54,
+     -13, -17, 7, 8, 29, 56, 47, 57,
+     -27, -27, -16, -16, -1, 17, -2, 1,
+     -9, -26, -9, -10, -2, -4, 3, -3,
+     -14, 2, -11, -2, -5, 2, 14, 5,
+     -35, -8, 11, 2, 8, 15, -3, 1,
+     -1, -18, -9, 10, -15, -25, -31, -50),
+    (-65, 23, 16, -15, -56, -34, 2, 13,
+     29, -1, -20, -7, -8, -4, -38, -29,
+     -9, 24, 2, -16, -20, 6, 22, -22,
+     -17, -20, -12, -27, -30, -25, -14, -36,
+     -49, -1, -27, -39, -46, -44, -33, -51,
+     -14, -14, -22, -46, -44, -30, -15, -27,
+     1, 7, -8, -64, -43, -16, 9, 8,
+     -15, 36, 12, -54, 8, -28, 24, 14),
+)
+ENDGAME_TABLES = (
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     178, 173, 158, 134, 147, 132, 165, 187,
+     94, 100, 85, 67, 56, 53, 82, 84,
+     32, 24, 13, 5, -2, 4, 17, 17,
+     13, 9, -3, -7, -7, -8, 3, -1,
+     4, 7, -6, 1, 0, -5, -1, -8,
+     13, 8, 8, 10, 13, 0, 2, -7,
+     0, 0, 0, 0, 0, 0, 0, 0),
+    (-58, -38, -13, -28, -31, -27, -63, -99,
+     -25, -8, -25, -2, -9, -25, -24, -52,
+     -24, -20, 10, 9, -1, -9, -19, -41,
+     -17, 3, 22, 22, 22, 11, 8, -18,
+     -18, -6, 16, 25, 16, 17, 4, -18,
+     -23, -3, -1, 15, 10, -3, -20, -22,
+     -42, -20, -10, -5, -2, -20, -23, -44,
+     -29, -51, -23, -15, -22, -18, -50, -64),
+    (-14, -21, -11, -8, -7, -9, -17, -24,
+     -8, -4, 7, -12, -3, -13, -4, -14,
+     2, -8, 0, -1, -2, 6, 0, 4,
+     -3, 9, 12, 9, 14, 10, 3, 2,
+     -6, 3, 13, 19, 7, 10, -3, -9,
+     -12, -3, 8, 10, 13, 3, -7, -15,
+     -14, -18, -7, -1, 4, -9, -15, -27,
+     -23, -9, -23, -5, -9, -16, -5, -17),
+    (13, 10, 18, 15, 12, 12, 8, 5,
+     11, 13, 13, 11, -3, 3, 8, 3,
+     7, 7, 7, 5, 4, -3, -5, -3,
+     4, 3, 13, 1, 2, 1, -1, 2,
+     3, 5, 8, 4, -5, -6, -8, -11,
+     -4, 0, -5, -1, -7, -12, -8, -16,
+     -6, -6, 0, 2, -9, -9, -11, -3,
+     -9, 2, 3, -1, -5, -13, 4, -20),
+    (-9, 22, 22, 27, 27, 19, 10, 20,
+     -17, 20, 32, 41, 58, 25, 30, 0,
+     -20, 6, 9, 49, 47, 35, 19, 9,
+     3, 22, 24, 45, 57, 40, 57, 36,
+     -18, 28, 19, 47, 31, 34, 39, 23,
+     -16, -27, 15, 6, 9, 17, 10, 5,
+     -22, -23, -30, -16, -16, -23, -36, -32,
+     -33, -28, -22, -43, -5, -32, -20, -41),
+    (-74, -35, -18, -18, -11, 15, 4, -17,
+     -12, 17, 14, 17, 17, 38, 23, 11,
+     10, 17, 23, 15, 20, 45, 44, 13,
+     -8, 22, 24, 27, 26, 33, 26, 3,
+     -18, -4, 21, 24, 27, 23, 9, -11,
+     -19, -3, 11, 21, 23, 16, 7, -9,
+     -27, -11, 4, 13, 14, 4, -5, -17,
+     -53, -34, -21, -11, -28, -14, -24, -43),
+)
+# Width in bits of each field of a packed evaluation term
+EVALUATION_FIELD_BITS = 24
+
+# Plies between the position records kept by a GameHistory
+HISTORY_SNAPSHOT_INTERVAL = 32
+
+# Constants for the game server
+SERVER_PORT = 8765
+SERVER_BATCH_SIZE = 256
+SERVER_BATCH_DELAY = 0.002
+SERVER_IDLE_TIMEOUT = 300.0
+SERVER_EVICTION_INTERVAL = 30.0
+SERVER_GAME_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Constants for endgame tablebases. A table covers one material set, named
+# like 'KQvKR' with the stronger side first, and holds a byte per position:
+# 0 for a draw, otherwise the distance to mate in plies + 1 (odd distances
+# win for the player to move, even ones lose), or TABLEBASE_INVALID for
+# indices that are not legal canonical positions.
+TABLEBASE_FILE_MAGIC = b'PCTB'
+TABLEBASE_MAX_PIECES = 4
+TABLEBASE_INVALID = 255
+TABLEBASE_PIECE_ORDER = 'KQRBNP'
+TABLEBASE_MATERIAL_PATTERN = re.compile(r'^K[QRBNP]*vK[QRBNP]*$')
+# Kinds of work item in tablebase generation: a child outside the table was
+# lost or won for its player to move, or a position was resolved
+TABLEBASE_CHILD_LOST, TABLEBASE_CHILD_WON, TABLEBASE_RESOLVED = range(3)
+
+# Constants for Polyglot opening books: entries are a big-endian key, move,
+# weight and learn value sorted by key. A book move packs the end file and
+# rank in bits 0-5, the start file and rank in bits 6-11 and the promotion
+# piece (1-4 for NBRQ) in bits 12-14; ranks count from rank 1 and castling
+# is written as the king taking its own rook.
+BOOK_ENTRY = struct.Struct('>QHHI')
+BOOK_MAX_PLY = 30
+# Weight a book move earns per game result, for White and Black moves
+BOOK_RESULT_WEIGHTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1), '*': (1, 1)}
+POLYGLOT_RANDOM_ARRAY = (
+    0x9D39247E33776D41, 0x2AF7398005AAA5C7, 0x44DB015024623547, 0x9C15F73E62A76AE2,
+    0x75834465489C0C89, 0x3290AC3A203001BF, 0x0FBBAD1F61042279, 0xE83A908FF2FB60CA,
+    0x0D7E765D58755C10, 0x1A083822CEAFE02D, 0x9605D5F0E25EC3B0, 0xD021FF5CD13A2ED5,
+    0x40BDF15D4A672E32, 0x011355146FD56395, 0x5DB4832046F3D9E5, 0x239F8B2D7FF719CC,
+    0x05D1A1AE85B49AA1, 0x679F848F6E8FC971, 0x7449BBFF801FED0B, 0x7D11CDB1C3B7ADF0,
+    0x82C7709E781EB7CC, 0xF3218F1C9510786C, 0x331478F3AF51BBE6, 0x4BB38DE5E7219443,
+    0xAA649C6EBCFD50FC, 0x8DBD98A352AFD40B, 0x87D2074B81D79217, 0x19F3C751D3E92AE1,
+    0xB4AB30F062B19ABF, 0x7B0500AC42047AC4, 0xC9452CA81A09D85D, 0x24AA6C514DA27500,
+    0x4C9F34427501B447, 0x14A68FD73C910841, 0xA71B9B83461CBD93, 0x03488B95B0F1850F,
+    0x637B2B34FF93C040, 0x09D1BC9A3DD90A94, 0x3575668334A1DD3B, 0x735E2B97A4C45A23,
+    0x18727070F1BD400B, 0x1FCBACD259BF02E7, 0xD310A7C2CE9B6555, 0xBF983FE0FE5D8244,
+    0x9F74D14F7454A824, 0x51EBDC4AB9BA3035, 0x5C82C505DB9AB0FA, 0xFCF7FE8A3430B241,
+    0x3253A729B9BA3DDE, 0x8C74C368081B3075, 0xB9BC6C87167C33E7, 0x7EF48F2B83024E20,
+    0x11D505D4C351BD7F, 0x6568FCA92C76A243, 0x4DE0B0F40F32A7B8, 0x96D693460CC37E5D,
+    0x42E240CB63689F2F, 0x6D2BDCDAE2919661, 0x42880B0236E4D951, 0x5F0F4A5898171BB6,
+    0x39F890F579F92F88, 0x93C5B5F47356388B, 0x63DC359D8D231B78, 0xEC16CA8AEA98AD76,
+    0x5355F900C2A82DC7, 0x07FB9F855A997142, 0x5093417AA8A7ED5E, 0x7BCBC38DA25A7F3C,
+    0x19FC8A768CF4B6D4, 0x637A7780DECFC0D9, 0x8249A47AEE0E41F7, 0x79AD695501E7D1E8,
+    0x14ACBAF4777D5776, 0xF145B6BECCDEA195, 0xDABF2AC8201752FC, 0x24C3C94DF9C8D3F6,
+    0xBB6E2924F03912EA, 0x0CE26C0B95C980D9, 0xA49CD132BFBF7CC4, 0xE99D662AF4243939,
+    0x27E6AD7891165C3F, 0x8535F040B9744FF1, 0x54B3F4FA5F40D873, 0x72B12C32127FED2B,
+    0xEE954D3C7B411F47, 0x9A85AC909A24EAA1, 0x70AC4CD9F04F21F5, 0xF9B89D3E99A075C2,
+    0x87B3E2B2B5C907B1, 0xA366E5B8C54F48B8, 0xAE4A9346CC3F7CF2, 0x1920C04D47267BBD,
+    0x87BF02C6B49E2AE9, 0x092237AC237F3859, 0xFF07F64EF8ED14D0, 0x8DE8DCA9F03CC54E,
+    0x9C1633264DB49C89, 0xB3F22C3D0B0B38ED, 0x390E5FB44D01144B, 0x5BFEA5B4712768E9,
+    0x1E1032911FA78984, 0x9A74ACB964E78CB3, 0x4F80F7A035DAFB04, 0x6304D09A0B3738C4,
+    0x2171E64683023A08, 0x5B9B63EB9CEFF80C, 0x506AACF489889342, 0x1881AFC9A3A701D6,
+    0x6503080440750644, 0xDFD395339CDBF4A7, 0xEF927DBCF00C20F2, 0x7B32F7D1E03680EC,
+    0xB9FD7620E7316243, 0x05A7E8A57DB91B77, 0xB5889C6E15630A75, 0x4A750A09CE9573F7,
+    0xCF464CEC899A2F8A, 0xF538639CE705B824, 0x3C79A0FF5580EF7F, 0xEDE6C87F8477609D,
+    0x799E81F05BC93F31, 0x86536B8CF3428A8C, 0x97D7374C60087B73, 0xA246637CFF328532,
+    0x043FCAE60CC0EBA0, 0x920E449535DD359E, 0x70EB093B15B290CC, 0x73A1921916591CBD,
+    0x56436C9FE1A1AA8D, 0xEFAC4B70633B8F81, 0xBB215798D45DF7AF, 0x45F20042F24F1768,
+    0x930F80F4E8EB7462, 0xFF6712FFCFD75EA1, 0xAE623FD67468AA70, 0xDD2C5BC84BC8D8FC,
+    0x7EED120D54CF2DD9, 0x22FE545401165F1C, 0xC91800E98FB99929, 0x808BD68E6AC10365,
+    0xDEC468145B7605F6, 0x1BEDE3A3AEF53302, 0x43539603D6C55602, 0xAA969B5C691CCB7A,
+    0xA87832D392EFEE56, 0x65942C7B3C7E11AE, 0xDED2D633CAD004F6, 0x21F08570F420E565,
+    0xB415938D7DA94E3C, 0x91B859E59ECB6350, 0x10CFF333E0ED804A, 0x28AED140BE0BB7DD,
+    0xC5CC1D89724FA456, 0x5648F680F11A2741, 0x2D255069F0B7DAB3, 0x9BC5A38EF729ABD4,
+    0xEF2F054308F6A2BC, 0xAF2042F5CC5C2858, 0x480412BAB7F5BE2A, 0xAEF3AF4A563DFE43,
+    0x19AFE59AE451497F, 0x52593803DFF1E840, 0xF4F076E65F2CE6F0, 0x11379625747D5AF3,
+    0xBCE5D2248682C115, 0x9DA4243DE836994F, 0x066F70B33FE09017, 0x4DC4DE189B671A1C,
+    0x51039AB7712457C3, 0xC07A3F80C31FB4B4, 0xB46EE9C5E64A6E7C, 0xB3819A42ABE61C87,
+    0x21A007933A522A20, 0x2DF16F761598AA4F, 0x763C4A1371B368FD, 0xF793C46702E086A0,
+    0xD7288E012AEB8D31, 0xDE336A2A4BC1C44B, 0x0BF692B38D079F23, 0x2C604A7A177326B3,
+    0x4850E73E03EB6064, 0xCFC447F1E53C8E1B, 0xB05CA3F564268D99, 0x9AE182C8BC9474E8,
+    0xA4FC4BD4FC5558CA, 0xE755178D58FC4E76, 0x69B97DB1A4C03DFE, 0xF9B5B7C4ACC67C96,
+    0xFC6A82D64B8655FB, 0x9C684CB6C4D24417, 0x8EC97D2917456ED0, 0x6703DF9D2924E97E,
+    0xC547F57E42A7444E, 0x78E37644E7CAD29E, 0xFE9A44E9362F05FA, 0x08BD35CC38336615,
+    0x9315E5EB3A129ACE, 0x94061B871E04DF75, 0xDF1D9F9D784BA010, 0x3BBA57B68871B59D,
+    0xD2B7ADEEDED1F73F, 0xF7A255D83BC373F8, 0xD7F4F2448C0CEB81, 0xD95BE88CD210FFA7,
+    0x336F52F8FF4728E7, 0xA74049DAC312AC71, 0xA2F61BB6E437FDB5, 0x4F2A5CB07F6A35B3,
+    0x87D380BDA5BF7859, 0x16B9F7E06C453A21, 0x7BA2484C8A0FD54E, 0xF3A678CAD9A2E38C,
+    0x39B0BF7DDE437BA2, 0xFCAF55C1BF8A4424, 0x18FCF680573FA594, 0x4C0563B89F495AC3,
+    0x40E087931A00930D, 0x8CFFA9412EB642C1, 0x68CA39053261169F, 0x7A1EE967D27579E2,
+    0x9D1D60E5076F5B6F, 0x3810E399B6F65BA2, 0x32095B6D4AB5F9B1, 0x35CAB62109DD038A,
+    0xA90B24499FCFAFB1, 0x77A225A07CC2C6BD, 0x513E5E634C70E331, 0x4361C0CA3F692F12,
+    0xD941ACA44B20A45B, 0x528F7C8602C5807B, 0x52AB92BEB9613989, 0x9D1DFA2EFC557F73,
+    0x722FF175F572C348, 0x1D1260A51107FE97, 0x7A249A57EC0C9BA2, 0x04208FE9E8F7F2D6,
+    0x5A110C6058B920A0, 0x0CD9A497658A5698, 0x56FD23C8F9715A4C, 0x284C847B9D887AAE,
+    0x04FEABFBBDB619CB, 0x742E1E651C60BA83, 0x9A9632E65904AD3C, 0x881B82A13B51B9E2,
+    0x506E6744CD974924, 0xB0183DB56FFC6A79, 0x0ED9B915C66ED37E, 0x5E11E86D5873D484,
+    0xF678647E3519AC6E, 0x1B85D488D0F20CC5, 0xDAB9FE6525D89021, 0x0D151D86ADB73615,
+    0xA865A54EDCC0F019, 0x93C42566AEF98FFB, 0x99E7AFEABE000731, 0x48CBFF086DDF285A,
+    0x7F9B6AF1EBF78BAF, 0x58627E1A149BBA21, 0x2CD16E2ABD791E33, 0xD363EFF5F0977996,
+    0x0CE2A38C344A6EED, 0x1A804AADB9CFA741, 0x907F30421D78C5DE, 0x501F65EDB3034D07,
+    0x37624AE5A48FA6E9, 0x957BAF61700CFF4E, 0x3A6C27934E31188A, 0xD49503536ABCA345,
+    0x088E049589C432E0, 0xF943AEE7FEBF21B8, 0x6C3B8E3E336139D3, 0x364F6FFA464EE52E,
+    0xD60F6DCEDC314222, 0x56963B0DCA418FC0, 0x16F50EDF91E513AF, 0xEF1955914B609F93,
+    0x565601C0364E3228, 0xECB53939887E8175, 0xBAC7A9A18531294B, 0xB344C470397BBA52,
+    0x65D34954DAF3CEBD, 0xB4B81B3FA97511E2, 0xB422061193D6F6A7, 0x071582401C38434D,
+    0x7A13F18BBEDC4FF5, 0xBC4097B116C524D2, 0x59B97885E2F2EA28, 0x99170A5DC3115544,
+    0x6F423357E7C6A9F9, 0x325928EE6E6F8794, 0xD0E4366228B03343, 0x565C31F7DE89EA27,
+    0x30F5611484119414, 0xD873DB391292ED4F, 0x7BD94E1D8E17DEBC, 0xC7D9F16864A76E94,
+    0x947AE053EE56E63C, 0xC8C93882F9475F5F, 0x3A9BF55BA91F81CA, 0xD9A11FBB3D9808E4,
+    0x0FD22063EDC29FCA, 0xB3F256D8ACA0B0B9, 0xB03031A8B4516E84, 0x35DD37D5871448AF,
+    0xE9F6082B05542E4E, 0xEBFAFA33D7254B59, 0x9255ABB50D532280, 0xB9AB4CE57F2D34F3,
+    0x693501D628297551, 0xC62C58F97DD949BF, 0xCD454F8F19C5126A, 0xBBE83F4ECC2BDECB,
+    0xDC842B7E2819E230, 0xBA89142E007503B8, 0xA3BC941D0A5061CB, 0xE9F6760E32CD8021,
+    0x09C7E552BC76492F, 0x852F54934DA55CC9, 0x8107FCCF064FCF56, 0x098954D51FFF6580,
+    0x23B70EDB1955C4BF, 0xC330DE426430F69D, 0x4715ED43E8A45C0A, 0xA8D7E4DAB780A08D,
+    0x0572B974F03CE0BB, 0xB57D2E985E1419C7, 0xE8D9ECBE2CF3D73F, 0x2FE4B17170E59750,
+    0x11317BA87905E790, 0x7FBF21EC8A1F45EC, 0x1725CABFCB045B00, 0x964E915CD5E2B207,
+    0x3E2B8BCBF016D66D, 0xBE7444E39328A0AC, 0xF85B2B4FBCDE44B7, 0x49353FEA39BA63B1,
+    0x1DD01AAFCD53486A, 0x1FCA8A92FD719F85, 0xFC7C95D827357AFA, 0x18A6A990C8B35EBD,
+    0xCCCB7005C6B9C28D, 0x3BDBB92C43B17F26, 0xAA70B5B4F89695A2, 0xE94C39A54A98307F,
+    0xB7A0B174CFF6F36E, 0xD4DBA84729AF48AD, 0x2E18BC1AD9704A68, 0x2DE0966DAF2F8B1C,
+    0xB9C11D5B1E43A07E, 0x64972D68DEE33360, 0x94628D38D0C20584, 0xDBC0D2B6AB90A559,
+    0xD2733C4335C6A72F, 0x7E75D99D94A70F4D, 0x6CED1983376FA72B, 0x97FCAACBF030BC24,
+    0x7B77497B32503B12, 0x8547EDDFB81CCB94, 0x79999CDFF70902CB, 0xCFFE1939438E9B24,
+    0x829626E3892D95D7, 0x92FAE24291F2B3F1, 0x63E22C147B9C3403, 0xC678B6D860284A1C,
+    0x5873888850659AE7, 0x0981DCD296A8736D, 0x9F65789A6509A440, 0x9FF38FED72E9052F,
+    0xE479EE5B9930578C, 0xE7F28ECD2D49EECD, 0x56C074A581EA17FE, 0x5544F7D774B14AEF,
+    0x7B3F0195FC6F290F, 0x12153635B2C0CF57, 0x7F5126DBBA5E0CA7, 0x7A76956C3EAFB413,
+    0x3D5774A11D31AB39, 0x8A1B083821F40CB4, 0x7B4A38E32537DF62, 0x950113646D1D6E03,
+    0x4DA8979A0041E8A9, 0x3BC36E078F7515D7, 0x5D0A12F27AD310D1, 0x7F9D1A2E1EBE1327,
+    0xDA3A361B1C5157B1, 0xDCDD7D20903D0C25, 0x36833336D068F707, 0xCE68341F79893389,
+    0xAB9090168DD05F34, 0x43954B3252DC25E5, 0xB438C2B67F98E5E9, 0x10DCD78E3851A492,
+    0xDBC27AB5447822BF, 0x9B3CDB65F82CA382, 0xB67B7896167B4C84, 0xBFCED1B0048EAC50,
+    0xA9119B60369FFEBD, 0x1FFF7AC80904BF45, 0xAC12FB171817EEE7, 0xAF08DA9177DDA93D,
+    0x1B0CAB936E65C744, 0xB559EB1D04E5E932, 0xC37B45B3F8D6F2BA, 0xC3A9DC228CAAC9E9,
+    0xF3B8B6675A6507FF, 0x9FC477DE4ED681DA, 0x67378D8ECCEF96CB, 0x6DD856D94D259236,
+    0xA319CE15B0B4DB31, 0x073973751F12DD5E, 0x8A8E849EB32781A5, 0xE1925C71285279F5,
+    0x74C04BF1790C0EFE, 0x4DDA48153C94938A, 0x9D266D6A1CC0542C, 0x7440FB816508C4FE,
+    0x13328503DF48229F, 0xD6BF7BAEE43CAC40, 0x4838D65F6EF6748F, 0x1E152328F3318DEA,
+    0x8F8419A348F296BF, 0x72C8834A5957B511, 0xD7A023A73260B45C, 0x94EBC8ABCFB56DAE,
+    0x9FC10D0F989993E0, 0xDE68A2355B93CAE6, 0xA44CFE79AE538BBE, 0x9D1D84FCCE371425,
+    0x51D2B1AB2DDFB636, 0x2FD7E4B9E72CD38C, 0x65CA5B96B7552210, 0xDD69A0D8AB3B546D,
+    0x604D51B25FBF70E2, 0x73AA8A564FB7AC9E, 0x1A8C1E992B941148, 0xAAC40A2703D9BEA0,
+    0x764DBEAE7FA4F3A6, 0x1E99B96E70A9BE8B, 0x2C5E9DEB57EF4743, 0x3A938FEE32D29981,
+    0x26E6DB8FFDF5ADFE, 0x469356C504EC9F9D, 0xC8763C5B08D1908C, 0x3F6C6AF859D80055,
+    0x7F7CC39420A3A545, 0x9BFB227EBDF4C5CE, 0x89039D79D6FC5C5C, 0x8FE88B57305E2AB6,
+    0xA09E8C8C35AB96DE, 0xFA7E393983325753, 0xD6B6D0ECC617C699, 0xDFEA21EA9E7557E3,
+    0xB67C1FA481680AF8, 0xCA1E3785A9E724E5, 0x1CFC8BED0D681639, 0xD18D8549D140CAEA,
+    0x4ED0FE7E9DC91335, 0xE4DBF0634473F5D2, 0x1761F93A44D5AEFE, 0x53898E4C3910DA55,
+    0x734DE8181F6EC39A, 0x2680B122BAA28D97, 0x298AF231C85BAFAB, 0x7983EED3740847D5,
+    0x66C1A2A1A60CD889, 0x9E17E49642A3E4C1, 0xEDB454E7BADC0805, 0x50B704CAB602C329,
+    0x4CC317FB9CDDD023, 0x66B4835D9EAFEA22, 0x219B97E26FFC81BD, 0x261E4E4C0A333A9D,
+    0x1FE2CCA76517DB90, 0xD7504DFA8816EDBB, 0xB9571FA04DC089C8, 0x1DDC0325259B27DE,
+    0xCF3F4688801EB9AA, 0xF4F5D05C10CAB243, 0x38B6525C21A42B0E, 0x36F60E2BA4FA6800,
+    0xEB3593803173E0CE, 0x9C4CD6257C5A3603, 0xAF0C317D32ADAA8A, 0x258E5A80C7204C4B,
+    0x8B889D624D44885D, 0xF4D14597E660F855, 0xD4347F66EC8941C3, 0xE699ED85B0DFB40D,
+    0x2472F6207C2D0484, 0xC2A1E7B5B459AEB5, 0xAB4F6451CC1D45EC, 0x63767572AE3D6174,
+    0xA59E0BD101731A28, 0x116D0016CB948F09, 0x2CF9C8CA052F6E9F, 0x0B090A7560A968E3,
+    0xABEEDDB2DDE06FF1, 0x58EFC10B06A2068D, 0xC6E57A78FBD986E0, 0x2EAB8CA63CE802D7,
+    0x14A195640116F336, 0x7C0828DD624EC390, 0xD74BBE77E6116AC7, 0x804456AF10F5FB53,
+    0xEBE9EA2ADF4321C7, 0x03219A39EE587A30, 0x49787FEF17AF9924, 0xA1E9300CD8520548,
+    0x5B45E522E4B1B4EF, 0xB49C3B3995091A36, 0xD4490AD526F14431, 0x12A8F216AF9418C2,
+    0x001F837CC7350524, 0x1877B51E57A764D5, 0xA2853B80F17F58EE, 0x993E1DE72D36D310,
+    0xB3598080CE64A656, 0x252F59CF0D9F04BB, 0xD23C8E176D113600, 0x1BDA0492E7E4586E,
+    0x21E0BD5026C619BF, 0x3B097ADAF088F94E, 0x8D14DEDB30BE846E, 0xF95CFFA23AF5F6F4,
+    0x3871700761B3F743, 0xCA672B91E9E4FA16, 0x64C8E531BFF53B55, 0x241260ED4AD1E87D,
+    0x106C09B972D2E822, 0x7FBA195410E5CA30, 0x7884D9BC6CB569D8, 0x0647DFEDCD894A29,
+    0x63573FF03E224774, 0x4FC8E9560F91B123, 0x1DB956E450275779, 0xB8D91274B9E9D4FB,
+    0xA2EBEE47E2FBFCE1, 0xD9F1F30CCD97FB09, 0xEFED53D75FD64E6B, 0x2E6D02C36017F67F,
+    0xA9AA4D20DB084E9B, 0xB64BE8D8B25396C1, 0x70CB6AF7C2D5BCF0, 0x98F076A4F7A2322E,
+    0xBF84470805E69B5F, 0x94C3251F06F90CF3, 0x3E003E616A6591E9, 0xB925A6CD0421AFF3,
+    0x61BDD1307C66E300, 0xBF8D5108E27E0D48, 0x240AB57A8B888B20, 0xFC87614BAF287E07,
+    0xEF02CDD06FFDB432, 0xA1082C0466DF6C0A, 0x8215E577001332C8, 0xD39BB9C3A48DB6CF,
+    0x2738259634305C14, 0x61CF4F94C97DF93D, 0x1B6BACA2AE4E125B, 0x758F450C88572E0B,
+    0x959F587D507A8359, 0xB063E962E045F54D, 0x60E8ED72C0DFF5D1, 0x7B64978555326F9F,
+    0xFD080D236DA814BA, 0x8C90FD9B083F4558, 0x106F72FE81E2C590, 0x7976033A39F7D952,
+    0xA4EC0132764CA04B, 0x733EA705FAE4FA77, 0xB4D8F77BC3E56167, 0x9E21F4F903B33FD9,
+    0x9D765E419FB69F6D, 0xD30C088BA61EA5EF, 0x5D94337FBFAF7F5B, 0x1A4E4822EB4D7A59,
+    0x6FFE73E81B637FB3, 0xDDF957BC36D8B9CA, 0x64D0E29EEA8838B3, 0x08DD9BDFD96B9F63,
+    0x087E79E5A57D1D13, 0xE328E230E3E2B3FB, 0x1C2559E30F0946BE, 0x720BF5F26F4D2EAA,
+    0xB0774D261CC609DB, 0x443F64EC5A371195, 0x4112CF68649A260E, 0xD813F2FAB7F5C5CA,
+    0x660D3257380841EE, 0x59AC2C7873F910A3, 0xE846963877671A17, 0x93B633ABFA3469F8,
+    0xC0C0F5A60EF4CDCF, 0xCAF21ECD4377B28C, 0x57277707199B8175, 0x506C11B9D90E8B1D,
+    0xD83CC2687A19255F, 0x4A29C6465A314CD1, 0xED2DF21216235097, 0xB5635C95FF7296E2,
+    0x22AF003AB672E811, 0x52E762596BF68235, 0x9AEBA33AC6ECC6B0, 0x944F6DE09134DFB6,
+    0x6C47BEC883A7DE39, 0x6AD047C430A12104, 0xA5B1CFDBA0AB4067, 0x7C45D833AFF07862,
+    0x5092EF950A16DA0B, 0x9338E69C052B8E7B, 0x455A4B4CFE30E3F5, 0x6B02E63195AD0CF8,
+    0x6B17B224BAD6BF27, 0xD1E0CCD25BB9C169, 0xDE0C89A556B9AE70, 0x50065E535A213CF6,
+    0x9C1169FA2777B874, 0x78EDEFD694AF1EED, 0x6DC93D9526A50E68, 0xEE97F453F06791ED,
+    0x32AB0EDB696703D3, 0x3A6853C7E70757A7, 0x31865CED6120F37D, 0x67FEF95D92607890,
+    0x1F2B1D1F15F6DC9C, 0xB69E38A8965C6B65, 0xAA9119FF184CCCF4, 0xF43C732873F24C13,
+    0xFB4A3D794A9A80D2, 0x3550C2321FD6109C, 0x371F77E76BB8417E, 0x6BFA9AAE5EC05779,
+    0xCD04F3FF001A4778, 0xE3273522064480CA, 0x9F91508BFFCFC14A, 0x049A7F41061A9E60,
+    0xFCB6BE43A9F2FE9B, 0x08DE8A1C7797DA9B, 0x8F9887E6078735A1, 0xB5B4071DBFC73A66,
+    0x230E343DFBA08D33, 0x43ED7F5A0FAE657D, 0x3A88A0FBBCB05C63, 0x21874B8B4D2DBC4F,
+    0x1BDEA12E35F6A8C9, 0x53C065C6C8E63528, 0xE34A1D250E7A8D6B, 0xD6B04D3B7651DD7E,
+    0x5E90277E7CB39E2D, 0x2C046F22062DC67D, 0xB10BB459132D0A26, 0x3FA9DDFB67E2F199,
+    0x0E09B88E1914F7AF, 0x10E8B35AF3EEAB37, 0x9EEDECA8E272B933, 0xD4C718BC4AE8AE5F,
+    0x81536D601170FC20, 0x91B534F885818A06, 0xEC8177F83F900978, 0x190E714FADA5156E,
+    0xB592BF39B0364963, 0x89C350C893AE7DC1, 0xAC042E70F8B383F2, 0xB49B52E587A1EE60,
+    0xFB152FE3FF26DA89, 0x3E666E6F69AE2C15, 0x3B544EBE544C19F9, 0xE805A1E290CF2456,
+    0x24B33C9D7ED25117, 0xE74733427B72F0C1, 0x0A804D18B7097475, 0x57E3306D881EDB4F,
+    0x4AE7D6A36EB5DBCB, 0x2D8D5432157064C8, 0xD1E649DE1E7F268B, 0x8A328A1CEDFE552C,
+    0x07A3AEC79624C7DA, 0x84547DDC3E203C94, 0x990A98FD5071D263, 0x1A4FF12616EEFC89,
+    0xF6F7FD1431714200, 0x30C05B1BA332F41C, 0x8D2636B81555A786, 0x46C9FEB55D120902,
+    0xCCEC0A73B49C9921, 0x4E9D2827355FC492, 0x19EBB029435DCB0F, 0x4659D2B743848A2C,
+    0x963EF2C96B33BE31, 0x74F85198B05A2E7D, 0x5A0F544DD2B1FB18, 0x03727073C2E134B1,
+    0xC7F6AA2DE59AEA61, 0x352787BAA0D7C22F, 0x9853EAB63B5E0B35, 0xABBDCDD7ED5C0860,
+    0xCF05DAF5AC8D77B0, 0x49CAD48CEBF4A71E, 0x7A4C10EC2158C4A6, 0xD9E92AA246BF719E,
+    0x13AE978D09FE5557, 0x730499AF921549FF, 0x4E4B705B92903BA4, 0xFF577222C14F0A3A,
+    0x55B6344CF97AAFAE, 0xB862225B055B6960, 0xCAC09AFBDDD2CDB4, 0xDAF8E9829FE96B5F,
+    0xB5FDFC5D3132C498, 0x310CB380DB6F7503, 0xE87FBB46217A360E, 0x2102AE466EBB1148,
+    0xF8549E1A3AA5E00D, 0x07A69AFDCC42261A, 0xC4C118BFE78FEAAE, 0xF9F4892ED96BD438,
+    0x1AF3DBE25D8F45DA, 0xF5B4B0B0D2DEEEB4, 0x962ACEEFA82E1C84, 0x046E3ECAAF453CE9,
+    0xF05D129681949A4C, 0x964781CE734B3C84, 0x9C2ED44081CE5FBD, 0x522E23F3925E319E,
+    0x177E00F9FC32F791, 0x2BC60A63A6F3B3F2, 0x222BBFAE61725606, 0x486289DDCC3D6780,
+    0x7DC7785B8EFDFC80, 0x8AF38731C02BA980, 0x1FAB64EA29A2DDF7, 0xE4D9429322CD065A,
+    0x9DA058C67844F20C, 0x24C0E332B70019B0, 0x233003B5A6CFE6AD, 0xD586BD01C5C217F6,
+    0x5E5637885F29BC2B, 0x7EBA726D8C94094B, 0x0A56A5F0BFE39272, 0xD79476A84EE20D06,
+    0x9E4C1269BAA4BF37, 0x17EFEE45B0DEE640, 0x1D95B0A5FCF90BC6, 0x93CBE0B699C2585D,
+    0x65FA4F227A2B6D79, 0xD5F9E858292504D5, 0xC2B5A03F71471A6F, 0x59300222B4561E00,
+    0xCE2F8642CA0712DC, 0x7CA9723FBB2E8988, 0x2785338347F2BA08, 0xC61BB3A141E50E8C,
+    0x150F361DAB9DEC26, 0x9F6A419D382595F4, 0x64A53DC924FE7AC9, 0x142DE49FFF7A7C3D,
+    0x0C335248857FA9E7, 0x0A9C32D5EAE45305, 0xE6C42178C4BBB92E, 0x71F1CE2490D20B07,
+    0xF1BCC3D275AFE51A, 0xE728E8C83C334074, 0x96FBF83A12884624, 0x81A1549FD6573DA5,
+    0x5FA7867CAF35E149, 0x56986E2EF3ED091B, 0x917F1DD5F8886C61, 0xD20D8C88C8FFE65F,
+    0x31D71DCE64B2C310, 0xF165B587DF898190, 0xA57E6339DD2CF3A0, 0x1EF6E6DBB1961EC9,
+    0x70CC73D90BC26E24, 0xE21A6B35DF0C3AD7, 0x003A93D8B2806962, 0x1C99DED33CB890A1,
+    0xCF3145DE0ADD4289, 0xD0E4427A5514FB72, 0x77C621CC9FB3A483, 0x67A34DAC4356550B,
+    0xF8D626AAAF278509,
+)
+
+# Constants for position indexes: after a FILE_HEADER, entries are a position
+# hash, an encoded move (INDEX_NO_MOVE for a position a game ended in) and
+# the number of times it was played, sorted by hash and move. Counts
+# saturate at 2**32 - 1.
+INDEX_FILE_MAGIC = b'PCIX'
+INDEX_ENTRY = struct.Struct('<QHxxI')
+INDEX_NO_MOVE = 0
+INDEX_MAX_COUNT = 0xFFFFFFFF
+# Distinct entries held in memory before a sorted run is spilled to disk,
+# and runs merged at once
+INDEX_RUN_SIZE = 1 << 20
+INDEX_MERGE_FAN_IN = 64
+
+# Constants for encoded moves: bits 0-5 hold the start index, bits 6-11 the
+# end index and bits 12-15 the flag below
+QUIET_MOVE = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT_CAPTURE = 5
+PROMOTION = 8
+PROMOTION_FLAG = PROMOTION << 12
+PROMOTION_PIECES = ('NBRQ', 'nbrq')
+PROMOTION_ORDER = (PROMOTION | 3, PROMOTION | 2, PROMOTION | 1, PROMOTION)
+TACTICAL_FLAGS = (CAPTURE | PROMOTION) << 12
+
+
+def _zobrist_keys():
+    # A private generator keeps the keys identical to those of earlier
+    # releases without reseeding the global random module.
+    generator = random.Random(125104875299311)
+    pieces = [generator.getrandbits(64) for _ in range(12 * 64)]
+    side = generator.getrandbits(64)
+    castling = [generator.getrandbits(64) for _ in range(4)]
+    en_passant = [generator.getrandbits(64) for _ in range(8)]
+    return pieces, side, castling, en_passant
+
+
+# Zobrist keys, shared by every board: piece keys are indexed by
+# PIECE_INDEX[piece] * 64 + index and castling keys by flag - CASTLING_RIGHTS_KINGSIDE_WHITE
+ZOBRIST_PIECES, ZOBRIST_SIDE, ZOBRIST_CASTLING, ZOBRIST_EN_PASSANT = _zobrist_keys()
+
+
+def _evaluation_terms():
+    # Each entry packs the middlegame score, the endgame score and the phase
+    # weight of a piece on a square into one int, so placing or removing a
+    # piece updates all three with a single addition. Black entries are the
+    # negated white entries of the mirrored square.
+    terms = []
+    for color in (WHITE, BLACK):
+        sign = -1 if color == BLACK else 1
+        for piece_type in range(6):
+            for index in range(64):
+                square = index ^ 56 if color == BLACK else index
+                middlegame = sign * (MIDDLEGAME_VALUES[piece_type] + MIDDLEGAME_TABLES[piece_type][square])
+                endgame = sign * (ENDGAME_VALUES[piece_type] + ENDGAME_TABLES[piece_type][square])
+                terms.append(middlegame + (endgame << EVALUATION_FIELD_BITS) +
+                             (PHASE_WEIGHTS[piece_type] << 2 * EVALUATION_FIELD_BITS))
+    return terms
+
+
+# Evaluation terms indexed like ZOBRIST_PIECES
+EVALUATION_TERMS = _evaluation_terms()
+
+
+def _polyglot_keys():
+    # Rearranges POLYGLOT_RANDOM_ARRAY into the layout of the Zobrist keys
+    # above. Polyglot numbers pieces black pawn, white pawn, black knight, ...
+    # and squares from a1, where index 0 of a board is a8.
+    pieces = []
+    for piece_index in range(12):
+        kind = 2 * (piece_index % 6) + (piece_index < 6)
+        for index in range(64):
+            pieces.append(POLYGLOT_RANDOM_ARRAY[64 * kind + 8 * (7 - index // 8) + index % 8])
+    return pieces, POLYGLOT_RANDOM_ARRAY[780], list(POLYGLOT_RANDOM_ARRAY[768:772]), list(POLYGLOT_RANDOM_ARRAY[772:780])
+
+
+# Polyglot opening book keys, laid out like the Zobrist keys
+POLYGLOT_PIECES, POLYGLOT_SIDE, POLYGLOT_CASTLING, POLYGLOT_EN_PASSANT = _polyglot_keys()
+
+
+def _leaper_attacks(offsets):
+    table = []
+    for index in range(64):
+        x, y = index % 8, index // 8
+        attacks = 0
+        for dx, dy in offsets:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < 8 and 0 <= ny < 8:
+                attacks |= 1 << (ny * 8 + nx)
+        table.append(attacks)
+    return table
+
+
+def _slider_attacks(directions):
+    # For every square, maps each occupancy of the inner squares of a line to
+    # the attack set along that line. Edge squares never block anything, so
+    # they are left out of the mask to keep the tables small.
+    masks = []
+    tables = []
+    for index in range(64):
+        x, y = index % 8, index // 8
+        mask = 0
+        for dx, dy in directions:
+            nx, ny = x + dx, y + dy
+            while 0 <= nx + dx < 8 and 0 <= ny + dy < 8:
+                mask |= 1 << (ny * 8 + nx)
+                nx += dx
+                ny += dy
+        table = {}
+        subset = 0
+        while True:
+            attacks = 0
+            for dx, dy in directions:
+                nx, ny = x + dx, y + dy
+                while 0 <= nx < 8 and 0 <= ny < 8:
+                    bit = 1 << (ny * 8 + nx)
+                    attacks |= bit
+                    if subset & bit:
+                        break
+                    nx += dx
+                    ny += dy
+            table[subset] = attacks
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = _leaper_attacks(KING_OFFSETS)
+PAWN_ATTACKS = (_leaper_attacks([(-1, -1), (1, -1)]), _leaper_attacks([(-1, 1), (1, 1)]))
+RANK_MASKS, RANK_ATTACKS = _slider_attacks([(-1, 0), (1, 0)])
+FILE_MASKS, FILE_ATTACKS = _slider_attacks([(0, -1), (0, 1)])
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = _slider_attacks([(-1, -1), (1, 1)])
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_ATTACKS = _slider_attacks([(1, -1), (-1, 1)])
+
+
+def _between_squares():
+    table = [[0] * 64 for _ in range(64)]
+    for index in range(64):
+        x, y = index % 8, index // 8
+        for dx, dy in KING_OFFSETS:
+            nx, ny = x + dx, y + dy
+            between = 0
+            while 0 <= nx < 8 and 0 <= ny < 8:
+                target = ny * 8 + nx
+                table[index][target] = between
+                between |= 1 << target
+                nx += dx
+                ny += dy
+    return table
+
+
+BETWEEN = _between_squares()
+
+
+def _tablebase_symmetries():
+    # For each square of the white king, the board symmetries that take it to
+    # its canonical square: into the a1-d1-d4 triangle in tables without
+    # pawns, and onto files a-d in tables with pawns, which only mirror files.
+    transforms = []
+    for transpose in (False, True):
+        for file_mask in (0, 7):
+            for row_mask in (0, 7):
+                transforms.append([
+                    ((index % 8 if transpose else index // 8) ^ row_mask) * 8 +
+                    ((index // 8 if transpose else index % 8) ^ file_mask)
+                    for index in range(64)
+                ])
+    triangle = [index for index in range(64) if 7 - index // 8 <= index % 8 <= 3]
+    pawnless = [[transform for transform in transforms if transform[index] in triangle] for index in range(64)]
+    pawns = [[transforms[0] if index % 8 <= 3 else transforms[2]] for index in range(64)]
+    half = [index for index in range(64) if index % 8 <= 3]
+    return triangle, pawnless, half, pawns
+
+
+# Canonical white king squares and the symmetries that reach them, for
+# tables without and with pawns
+PAWNLESS_KING_SQUARES, PAWNLESS_SYMMETRIES, PAWN_KING_SQUARES, PAWN_SYMMETRIES = _tablebase_symmetries()
+
+
+def bishop_attacks(index, occupied):
+    return (DIAGONAL_ATTACKS[index][occupied & DIAGONAL_MASKS[index]] |
+            ANTI_DIAGONAL_ATTACKS[index][occupied & ANTI_DIAGONAL_MASKS[index]])
+
+
+def rook_attacks(index, occupied):
+    return (RANK_ATTACKS[index][occupied & RANK_MASKS[index]] |
+            FILE_ATTACKS[index][occupied & FILE_MASKS[index]])
+
+
+def bit_indices(bitboard):
+    indices = []
+    while bitboard:
+        bit = bitboard & -bitboard
+        indices.append(bit.bit_length() - 1)
+        bitboard ^= bit
+    return indices
+
+
+def _parse_fen(fen):
+    fields = fen.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid FEN: {fen}")
+    rows = fields[0].translate(FEN_EXPANSION).split('/')
+    if len(rows) != 8 or any(len(row) != 8 for row in rows):
+        raise ValueError(f"Invalid FEN: {fen}")
+    board = list(''.join(rows))
+    if not FEN_PIECES.issuperset(board):
+        raise ValueError(f"Invalid FEN: {fen}")
+    player_to_move, castling, en_passant = fields[1:4]
+    if player_to_move not in ('w', 'b'):
+        raise ValueError(f"Invalid FEN: {fen}")
+    if castling != '-' and not set('KQkq').issuperset(castling):
+        raise ValueError(f"Invalid FEN: {fen}")
+    # Each castling right needs its king and rook on their home squares
+    for letter in castling.replace('-', ''):
+        king, king_index, rook, rook_index = FEN_CASTLING_SQUARES[letter]
+        if board[king_index] != king or board[rook_index] != rook:
+            raise ValueError(f"Invalid FEN: {fen}")
+    # An en passant square lies behind an enemy pawn that just made a double push
+    if en_passant != '-':
+        if en_passant not in SQUARE_INDEX or en_passant[1] != ('6' if player_to_move == 'w' else '3'):
+            raise ValueError(f"Invalid FEN: {fen}")
+        index = SQUARE_INDEX[en_passant]
+        if board[index] != ' ' or board[index + 8 if player_to_move == 'w' else index - 8] != (
+                'p' if player_to_move == 'w' else 'P'):
+            raise ValueError(f"Invalid FEN: {fen}")
+    try:
+        half_move_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError(f"Invalid FEN: {fen}") from None
+    # The clocks must fit the 16-bit fields of a POSITION_RECORD
+    if not 0 <= half_move_clock <= 0xFFFF or fullmove_number > 0xFFFF:
+        raise ValueError(f"Invalid FEN: {fen}")
+    board += [player_to_move, 'K' in castling, 'Q' in castling, 'k' in castling, 'q' in castling,
+              None if en_passant == '-' else en_passant, half_move_clock]
+    return board, max(fullmove_number, 1)
+
+
+def _unpack_record(data, offset=0):
+    # Returns the board list, position hash and fullmove number of a POSITION_RECORD
+    position_hash, pieces, flags, en_passant, half_move_clock, fullmove_number = \
+        POSITION_RECORD.unpack_from(data, offset)
+    placement = ''.join([NIBBLE_PAIRS[pair] for pair in pieces])
+    if '?' in placement or en_passant > 64:
+        raise ValueError("Invalid position record.")
+    board = list(placement) + [
+        'b' if flags & 1 else 'w', bool(flags & 2), bool(flags & 4), bool(flags & 8), bool(flags & 16),
+        SQUARE_NAMES[en_passant - 1] if en_passant else None, half_move_clock,
+    ]
+    return board, position_hash, max(fullmove_number, 1)
+
+
+def read_fens(source, boards=True):
+    """Lazily yields a Board per FEN line of a filename or text file object.
+
+    With boards=False the bare 71-element board lists are yielded instead.
+    """
+    if isinstance(source, str):
+        with open(source, 'r') as f:
+            yield from read_fens(f, boards)
+        return
+    for line in source:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if boards:
+            yield Board.from_fen(line)
+        else:
+            yield _parse_fen(line)[0]
+
+
+class PositionStore:
+    """Append-only file of fixed-width position records read back through mmap.
+
+    Records are POSITION_RECORD.size bytes each, after a FILE_HEADER, so
+    record i is found by offset arithmetic alone.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'a+b')
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        if size == 0:
+            self._file.write(FILE_HEADER.pack(STORE_FILE_MAGIC, FILE_FORMAT_VERSION, POSITION_RECORD.size))
+            self._file.flush()
+            size = FILE_HEADER.size
+        else:
+            self._file.seek(0)
+            magic, version, record_size = FILE_HEADER.unpack(self._file.read(FILE_HEADER.size))
+            if magic != STORE_FILE_MAGIC or version != FILE_FORMAT_VERSION or record_size != POSITION_RECORD.size:
+                self._file.close()
+                raise ValueError(f"Not a version {FILE_FORMAT_VERSION} position store: {filename}")
+        self._length = (size - FILE_HEADER.size) // POSITION_RECORD.size
+        self._mmap = None
+        self._mapped_length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, board):
+        record = board if isinstance(board, (bytes, bytearray)) else board.to_bytes()
+        if len(record) != POSITION_RECORD.size:
+            raise ValueError("Invalid position record.")
+        self._file.write(record)
+        self._length += 1
+        return self._length - 1
+
+    def extend(self, boards):
+        for board in boards:
+            self.append(board)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Position store index out of range.")
+        if index >= self._mapped_length:
+            self._remap()
+        offset = FILE_HEADER.size + index * POSITION_RECORD.size
+        return self._mmap[offset:offset + POSITION_RECORD.size]
+
+    def board(self, index):
+        return Board.from_bytes(self[index])
+
+    def records(self):
+        # A memoryview of every record, backed by the memory map
+        if self._mmap is None or self._length > self._mapped_length:
+            self._remap()
+        return memoryview(self._mmap)[FILE_HEADER.size:FILE_HEADER.size + self._length * POSITION_RECORD.size]
+
+    def position_hash(self, index):
+        return struct.unpack_from('<Q', self[index])[0]
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def _remap(self):
+        self._file.flush()
+        self._release()
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped_length = self._length
+
+    def flush(self):
+        self._file.flush()
+
+    def _release(self):
+        # A map with views from records() still exported stays open until
+        # they are released, instead of failing the read or close
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def close(self):
+        self._release()
+        self._file.close()
+
+
+class Position(bytes):
+    """Immutable snapshot of a position, stored as its packed POSITION_RECORD.
+
+    Positions hash by position_hash and compare equal when the hash, pieces,
+    player to move, castling rights and en passant square match, whatever
+    the clocks, so a transposition finds the same set or dict entry; they
+    pickle as the 48-byte record. Board.position() and Board.from_position()
+    convert without recomputing the hash.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, record):
+        if len(record) != POSITION_RECORD.size:
+            raise ValueError("Invalid position record.")
+        return super().__new__(cls, record)
+
+    def __hash__(self):
+        return self.position_hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            # NotImplemented would fall back to the bytes comparison, which
+            # would make a Position equal to its record with another hash
+            return False if isinstance(other, bytes) else NotImplemented
+        return self[:POSITION_KEY_SIZE] == other[:POSITION_KEY_SIZE]
+
+    def __ne__(self, other):
+        if not isinstance(other, Position):
+            return True if isinstance(other, bytes) else NotImplemented
+        return self[:POSITION_KEY_SIZE] != other[:POSITION_KEY_SIZE]
+
+    def __reduce__(self):
+        return Position, (bytes(self),)
+
+    def __repr__(self):
+        return f"Position({self.fen()!r})"
+
+    @property
+    def position_hash(self):
+        return int.from_bytes(self[:8], 'little')
+
+    @property
+    def board(self):
+        # A new 71-element board list decoded from the record
+        return _unpack_record(self)[0]
+
+    def player_to_move(self):
+        return 'b' if self[40] & 1 else 'w'
+
+    def fen(self):
+        return Board.from_bytes(self).fen()
+
+
+# Slots of a PositionCache entry
+CACHED_LEGAL_MOVES = 0
+CACHED_ATTACK_MAP = 1
+CACHED_CHECK = 2
+
+
+class PositionCache:
+    """LRU cache of per-position query results keyed by position hash."""
+
+    def __init__(self, max_size=4096):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1.")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, slot):
+        entry = self._entries.get(key)
+        if entry is None or entry[slot] is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[slot]
+
+    def put(self, key, slot, value):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [None, None, None]
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        entry[slot] = value
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def resize(self, max_size):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1.")
+        self.max_size = max_size
+        while len(self._entries) > max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class GameHistory:
+    """The moves of a game and the state needed to take each one back, in arrays.
+
+    Entry i holds the encoded move of ply i, the position hash and evaluation
+    terms before it, and its captured piece, castling rights, en passant
+    square and half-move clock packed into one int. A position record is
+    kept every HISTORY_SNAPSHOT_INTERVAL plies, so any ply can be reached by
+    replaying at most that many moves. Moves past ply stay available to
+    seek forward until a new move is pushed.
+    """
+
+    def __init__(self, position_hash_counts):
+        self.moves = array('H')
+        self.hashes = array('Q')
+        self.evaluations = array('q')
+        self.states = array('L')
+        self.snapshots = bytearray()
+        # Repetition counts of the position at ply 0
+        self.initial_counts = dict(position_hash_counts)
+        self.ply = 0
+
+    def __len__(self):
+        return len(self.moves)
+
+    def append(self, undo):
+        move, captured_piece, castling, en_passant, half_move_clock, position_hash, evaluation_terms = undo
+        self.moves.append(move)
+        self.hashes.append(position_hash)
+        self.evaluations.append(evaluation_terms)
+        self.states.append(
+            PIECE_NIBBLES[captured_piece] | castling[0] << 4 | castling[1] << 5 | castling[2] << 6 |
+            castling[3] << 7 | (SQUARE_INDEX[en_passant] + 1 if en_passant is not None else 0) << 8 |
+            half_move_clock << 15
+        )
+        self.ply += 1
+
+    def undo(self, ply):
+        # The undo tuple of _make_move for the move of ply
+        state = self.states[ply]
+        en_passant = (state >> 8) & 127
+        return (self.moves[ply], (' ' + PIECES)[state & 15], [bool(state >> bit & 1) for bit in range(4, 8)],
+                SQUARE_NAMES[en_passant - 1] if en_passant else None, state >> 15, self.hashes[ply],
+                self.evaluations[ply])
+
+    def truncate(self, ply):
+        del self.moves[ply:]
+        del self.hashes[ply:]
+        del self.evaluations[ply:]
+        del self.states[ply:]
+        del self.snapshots[(ply // HISTORY_SNAPSHOT_INTERVAL + 1) * POSITION_RECORD.size:]
+
+
+class Board:
+    # Shared by all boards; assign a PositionCache of another size, or None to
+    # disable caching, on the class or on a single instance.
+    cache = PositionCache()
+    # Created on the first search() and shared by all boards after that.
+    transposition_table = None
+    # A Tablebases directory for probe_tablebase(), shared by all boards
+    tablebases = None
+    zobrist_pieces = ZOBRIST_PIECES
+    zobrist_side = ZOBRIST_SIDE
+    zobrist_castling = ZOBRIST_CASTLING
+    zobrist_en_passant = ZOBRIST_EN_PASSANT
+
+    def __init__(self):
+        self.position_hash_counts = {}
+        self.board = None
+        self.position_hash = 0
+        self.evaluation_terms = 0
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self._history = None
+        self._initial_ply = 0
+        self._stats = {}
+
+    @classmethod
+    def new(cls):
+        instance = cls()
+        instance._initialize_new_game()
+        return instance
+
+    @classmethod
+    def load(cls, filename):
+        instance = cls()
+        instance._load_from_file(filename)
+        return instance
+
+    @classmethod
+    def from_fen(cls, fen):
+        instance = cls()
+        instance._initialize_from_fen(fen)
+        return instance
+
+    def _initialize_new_game(self):
+        self.board = (
+            ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r'] +
+            ['p'] * 8 +
+            [' '] * 32 +
+            ['P'] * 8 +
+            ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R'] +
+            ['w'] + [True, True, True, True] + [None] + [0]
+        )
+        self._initialize_bitboards()
+        self.position_hash = self._hash()
+        self.position_hash_counts = {self.position_hash: 1}
+        self._reset_history()
+
+    def _initialize_from_fen(self, fen):
+        self.board, fullmove_number = _parse_fen(fen)
+        self._initial_ply = 2 * (fullmove_number - 1) + (self.board[PLAYER_TO_MOVE] == 'b')
+        self._initialize_bitboards()
+        self.position_hash = self._hash()
+        self.position_hash_counts = {self.position_hash: 1}
+        self._reset_history()
+
+    def _reset_history(self):
+        # Starts a new history at the current position, dropping the old one.
+        # It is only built on first use, since most boards are never pushed.
+        self._history = None
+
+    @property
+    def history(self):
+        if self._history is None:
+            if self.board is None:
+                raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+            self._history = GameHistory(self.position_hash_counts)
+            self._history.snapshots += self.to_bytes()
+        return self._history
+
+    def fen(self):
+        board = self.board
+        placement = '/'.join(''.join(board[rank * 8:rank * 8 + 8]) for rank in range(8))
+        for spaces, digit in FEN_COMPRESSION:
+            placement = placement.replace(spaces, digit)
+        castling = ''.join(
+            letter for letter, flag in zip('KQkq', board[CASTLING_RIGHTS_KINGSIDE_WHITE:EN_PASSANT]) if flag
+        ) or '-'
+        return (f'{placement} {board[PLAYER_TO_MOVE]} {castling} {board[EN_PASSANT] or "-"} '
+                f'{board[HALF_MOVE_CLOCK]} {self._fullmove_number()}')
+
+    def _fullmove_number(self):
+        ply = self._history.ply if self._history is not None else 0
+        return (self._initial_ply + ply) // 2 + 1
+
+    @classmethod
+    def from_bytes(cls, data, position_hash_counts=None):
+        instance = cls()
+        instance._initialize_from_record(data)
+        if position_hash_counts is not None:
+            instance.position_hash_counts = position_hash_counts
+        instance._reset_history()
+        return instance
+
+    def position(self):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        return Position(self.to_bytes())
+
+    @classmethod
+    def from_position(cls, position, position_hash_counts=None):
+        return cls.from_bytes(position, position_hash_counts)
+
+    def _initialize_from_record(self, data, offset=0):
+        self.board, position_hash, fullmove_number = _unpack_record(data, offset)
+        self._initial_ply = 2 * (fullmove_number - 1) + (self.board[PLAYER_TO_MOVE] == 'b')
+        self._initialize_bitboards()
+        if self.zobrist_pieces is not ZOBRIST_PIECES:
+            position_hash = self._hash()
+        self.position_hash = position_hash
+        self.position_hash_counts = {position_hash: 1}
+
+    def to_bytes(self):
+        board = self.board
+        pieces = bytes([PIECE_NIBBLES[board[index]] << 4 | PIECE_NIBBLES[board[index + 1]]
+                        for index in range(0, 64, 2)])
+        flags = ((board[PLAYER_TO_MOVE] == 'b') | board[CASTLING_RIGHTS_KINGSIDE_WHITE] << 1 |
+                 board[CASTLING_RIGHTS_QUEENSIDE_WHITE] << 2 | board[CASTLING_RIGHTS_KINGSIDE_BLACK] << 3 |
+                 board[CASTLING_RIGHTS_QUEENSIDE_BLACK] << 4)
+        en_passant = SQUARE_INDEX[board[EN_PASSANT]] + 1 if board[EN_PASSANT] is not None else 0
+        return POSITION_RECORD.pack(self.position_hash, pieces, flags, en_passant,
+                                    board[HALF_MOVE_CLOCK], self._fullmove_number())
+
+    def _load_from_file(self, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if data[:4] == GAME_FILE_MAGIC:
+            magic, version, record_size = FILE_HEADER.unpack_from(data)
+            if version != FILE_FORMAT_VERSION or record_size != POSITION_RECORD.size:
+                raise ValueError(f"Unsupported game file version {version}.")
+            offset = FILE_HEADER.size
+            self._initialize_from_record(data, offset)
+            offset += POSITION_RECORD.size
+            count, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            self.position_hash_counts = dict(REPETITION_ENTRY.iter_unpack(
+                data[offset:offset + count * REPETITION_ENTRY.size]))
+        else:
+            data = json.loads(data)
+            self.board = data['board']
+            self.position_hash = data['position_hash']
+            self.position_hash_counts = {int(key): count for key, count in data['position_hash_counts'].items()}
+            self._initial_ply = int(self.board[PLAYER_TO_MOVE] == 'b')
+            self._initialize_bitboards()
+        self._reset_history()
+
+    def save(self, filename, format='binary'):
+        if format == 'json':
+            data = {
+                'board': self.board,
+                'position_hash': self.position_hash,
+                'position_hash_counts': self.position_hash_counts
+            }
+            with open(filename, 'w') as f:
+                json.dump(data, f)
+        elif format == 'binary':
+            with open(filename, 'wb') as f:
+                f.write(FILE_HEADER.pack(GAME_FILE_MAGIC, FILE_FORMAT_VERSION, POSITION_RECORD.size))
+                f.write(self.to_bytes())
+                f.write(struct.pack('<I', len(self.position_hash_counts)))
+                f.write(b''.join(REPETITION_ENTRY.pack(position_hash, count)
+                                 for position_hash, count in self.position_hash_counts.items()))
+        else:
+            raise ValueError(f"Unknown save format: {format}")
+
+    def _initialize_bitboards(self):
+        bitboards = [0] * 12
+        evaluation_terms = 0
+        for index, piece in enumerate(self.board[:64]):
+            if piece != ' ':
+                piece_index = PIECE_INDEX[piece]
+                bitboards[piece_index] |= 1 << index
+                evaluation_terms += EVALUATION_TERMS[piece_index * 64 + index]
+        self.bitboards = bitboards
+        self.evaluation_terms = evaluation_terms
+        self.occupancy = [
+            bitboards[0] | bitboards[1] | bitboards[2] | bitboards[3] | bitboards[4] | bitboards[5],
+            bitboards[6] | bitboards[7] | bitboards[8] | bitboards[9] | bitboards[10] | bitboards[11],
+        ]
+
+    def _hash(self, keys=None):
+        # keys overrides the board's (pieces, side, castling, en passant) key tables
+        zobrist_pieces, zobrist_side, zobrist_castling, zobrist_en_passant = keys or (
+            self.zobrist_pieces, self.zobrist_side, self.zobrist_castling, self.zobrist_en_passant)
+        h = 0
+        for index, piece in enumerate(self.board[:64]):
+            if piece != ' ':
+                h ^= zobrist_pieces[PIECE_INDEX[piece] * 64 + index]
+        if self.board[PLAYER_TO_MOVE] == 'w':
+            h ^= zobrist_side
+        for offset in range(4):
+            if self.board[CASTLING_RIGHTS_KINGSIDE_WHITE + offset]:
+                h ^= zobrist_castling[offset]
+        if self.board[EN_PASSANT] is not None:
+            target_square = self.board[EN_PASSANT]
+            file = ord(target_square[0]) - ord('a')
+            h ^= zobrist_en_passant[file]
+        return h
+
+    def player_to_move(self):
+        return self.board[PLAYER_TO_MOVE]
+
+    def white_to_move(self):
+        return self.player_to_move() == 'w'
+
+    def black_to_move(self):
+        return self.player_to_move() == 'b'
+
+    def legal_moves(self):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        color = WHITE if self.white_to_move() else BLACK
+        promotion_pieces = PROMOTION_PIECES[color]
+        return [f'{SQUARE_NAMES[move & 63]}{SQUARE_NAMES[(move >> 6) & 63]}'
+                f'{promotion_pieces[(move >> 12) & 3] if move & PROMOTION_FLAG else ""}'
+                for move in self._cached_legal_moves()]
+
+    def legal_moves_encoded(self):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        return list(self._cached_legal_moves())
+
+    def _cached_legal_moves(self):
+        cache = self.cache
+        if cache is None:
+            return self._generate_legal_moves(WHITE if self.board[PLAYER_TO_MOVE] == 'w' else BLACK)
+        moves = cache.get(self.position_hash, CACHED_LEGAL_MOVES)
+        if moves is None:
+            moves = tuple(self._generate_legal_moves(WHITE if self.board[PLAYER_TO_MOVE] == 'w' else BLACK))
+            cache.put(self.position_hash, CACHED_LEGAL_MOVES, moves)
+        return moves
+
+    def _cached_attack_map(self):
+        opponent = BLACK if self.board[PLAYER_TO_MOVE] == 'w' else WHITE
+        cache = self.cache
+        if cache is None:
+            return self._attack_map(opponent)
+        attacks = cache.get(self.position_hash, CACHED_ATTACK_MAP)
+        if attacks is None:
+            attacks = self._attack_map(opponent)
+            cache.put(self.position_hash, CACHED_ATTACK_MAP, attacks)
+        return attacks
+
+    def _generate_legal_moves(self, color):
+        # Pinned pieces, checkers and the squares that resolve a check are
+        # worked out once, so only en passant needs a trial make/unmake.
+        bitboards = self.bitboards
+        offset = 6 * color
+        opponent = color ^ 1
+        king = bitboards[offset + KING]
+        if not king:
+            return []
+        king_pos = king.bit_length() - 1
+        own = self.occupancy[color]
+        their = self.occupancy[opponent]
+        occupied = own | their
+        empty = ~occupied & FULL_BOARD
+        attacked = self._attack_map(opponent, occupied ^ king)
+        moves = []
+        safe = KING_ATTACKS[king_pos] & ~attacked
+        for end in bit_indices(safe & their):
+            moves.append(king_pos | end << 6 | CAPTURE << 12)
+        for end in bit_indices(safe & empty):
+            moves.append(king_pos | end << 6)
+        checkers = self._attackers(king_pos, opponent, occupied)
+        if checkers & (checkers - 1):
+            return moves
+        if checkers:
+            check_mask = checkers | BETWEEN[king_pos][checkers.bit_length() - 1]
+        else:
+            check_mask = FULL_BOARD
+            rights = self._castling_rights(color, king_pos, attacked)
+            if rights['king_side']:
+                moves.append(king_pos | (king_pos + 2) << 6 | KING_CASTLE << 12)
+            if rights['queen_side']:
+                moves.append(king_pos | (king_pos - 2) << 6 | QUEEN_CASTLE << 12)
+        pins = {}
+        their_offset = 6 * opponent
+        queens = bitboards[their_offset + QUEEN]
+        snipers = ((rook_attacks(king_pos, their) & (bitboards[their_offset + ROOK] | queens)) |
+                   (bishop_attacks(king_pos, their) & (bitboards[their_offset + BISHOP] | queens)))
+        for sniper in bit_indices(snipers):
+            blockers = BETWEEN[king_pos][sniper] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pins[blockers.bit_length() - 1] = BETWEEN[king_pos][sniper] | (1 << sniper)
+        captures = their & check_mask
+        quiets = empty & check_mask
+        pawns = bitboards[offset + PAWN]
+        if color == WHITE:
+            single_pushes = (pawns >> 8) & empty
+            double_pushes = ((single_pushes & RANK_3) >> 8) & quiets
+            push = 8
+            pawn_moves = ((((pawns & ~FILE_A) >> 9) & captures, 9, CAPTURE),
+                          (((pawns & ~FILE_H) >> 7) & captures, 7, CAPTURE),
+                          (single_pushes & check_mask, 8, QUIET_MOVE))
+            last_rank = RANK_8
+        else:
+            single_pushes = (pawns << 8) & empty
+            double_pushes = ((single_pushes & RANK_6) << 8) & quiets
+            push = -8
+            pawn_moves = ((((pawns & ~FILE_A) << 7) & captures, -7, CAPTURE),
+                          (((pawns & ~FILE_H) << 9) & captures, -9, CAPTURE),
+                          (single_pushes & check_mask, -8, QUIET_MOVE))
+            last_rank = RANK_1
+        for pawn_targets, step, flag in pawn_moves:
+            for end in bit_indices(pawn_targets):
+                start = end + step
+                if start in pins and not pins[start] & (1 << end):
+                    continue
+                if (1 << end) & last_rank:
+                    for promotion in PROMOTION_ORDER:
+                        moves.append(start | end << 6 | (flag | promotion) << 12)
+                else:
+                    moves.append(start | end << 6 | flag << 12)
+        for end in bit_indices(double_pushes):
+            start = end + 2 * push
+            if start in pins and not pins[start] & (1 << end):
+                continue
+            moves.append(start | end << 6 | DOUBLE_PAWN_PUSH << 12)
+        en_passant_target = self._en_passant_target_index()
+        if en_passant_target >= 0:
+            for start in bit_indices(PAWN_ATTACKS[opponent][en_passant_target] & pawns):
+                move = start | en_passant_target << 6 | EN_PASSANT_CAPTURE << 12
+                undo = self._make_move(move)
+                if not self._king_attacked(color):
+                    moves.append(move)
+                self._unmake_move(undo)
+        for start in bit_indices(bitboards[offset + KNIGHT]):
+            if start not in pins:
+                attacks = KNIGHT_ATTACKS[start]
+                for end in bit_indices(attacks & captures):
+                    moves.append(start | end << 6 | CAPTURE << 12)
+                for end in bit_indices(attacks & quiets):
+                    moves.append(start | end << 6)
+        queens = bitboards[offset + QUEEN]
+        for start in bit_indices(bitboards[offset + BISHOP] | bitboards[offset + ROOK] | queens):
+            piece_type = PIECE_INDEX[self.board[start]] - offset
+            if piece_type == BISHOP:
+                attacks = bishop_attacks(start, occupied)
+            elif piece_type == ROOK:
+                attacks = rook_attacks(start, occupied)
+            else:
+                attacks = bishop_attacks(start, occupied) | rook_attacks(start, occupied)
+            if start in pins:
+                attacks &= pins[start]
+            for end in bit_indices(attacks & captures):
+                moves.append(start | end << 6 | CAPTURE << 12)
+            for end in bit_indices(attacks & quiets):
+                moves.append(start | end << 6)
+        return moves
+
+    def check(self):
+        cache = self.cache
+        if cache is None:
+            return self._king_attacked(WHITE if self.white_to_move() else BLACK)
+        in_check = cache.get(self.position_hash, CACHED_CHECK)
+        if in_check is None:
+            in_check = self._king_attacked(WHITE if self.white_to_move() else BLACK)
+            cache.put(self.position_hash, CACHED_CHECK, in_check)
+        return in_check
+
+    def _king_attacked(self, color):
+        king = self.bitboards[6 * color + KING]
+        if not king:
+            return True
+        return self._is_attacked(king.bit_length() - 1, color ^ 1)
+
+    def _is_attacked(self, index, by_color):
+        bitboards = self.bitboards
+        offset = 6 * by_color
+        if PAWN_ATTACKS[by_color ^ 1][index] & bitboards[offset + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[index] & bitboards[offset + KNIGHT]:
+            return True
+        if KING_ATTACKS[index] & bitboards[offset + KING]:
+            return True
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        queens = bitboards[offset + QUEEN]
+        if bishop_attacks(index, occupied) & (bitboards[offset + BISHOP] | queens):
+            return True
+        if rook_attacks(index, occupied) & (bitboards[offset + ROOK] | queens):
+            return True
+        return False
+
+    def _attackers(self, index, by_color, occupied):
+        bitboards = self.bitboards
+        offset = 6 * by_color
+        queens = bitboards[offset + QUEEN]
+        return ((PAWN_ATTACKS[by_color ^ 1][index] & bitboards[offset + PAWN]) |
+                (KNIGHT_ATTACKS[index] & bitboards[offset + KNIGHT]) |
+                (KING_ATTACKS[index] & bitboards[offset + KING]) |
+                (bishop_attacks(index, occupied) & (bitboards[offset + BISHOP] | queens)) |
+                (rook_attacks(index, occupied) & (bitboards[offset + ROOK] | queens)))
+
+    def _attack_map(self, by_color, occupied=None):
+        bitboards = self.bitboards
+        offset = 6 * by_color
+        if occupied is None:
+            occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        pawns = bitboards[offset + PAWN]
+        if by_color == WHITE:
+            attacks = ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+        else:
+            attacks = (((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)) & FULL_BOARD
+        for index in bit_indices(bitboards[offset + KNIGHT]):
+            attacks |= KNIGHT_ATTACKS[index]
+        for index in bit_indices(bitboards[offset + KING]):
+            attacks |= KING_ATTACKS[index]
+        queens = bitboards[offset + QUEEN]
+        for index in bit_indices(bitboards[offset + BISHOP] | queens):
+            attacks |= bishop_attacks(index, occupied)
+        for index in bit_indices(bitboards[offset + ROOK] | queens):
+            attacks |= rook_attacks(index, occupied)
+        return attacks
+
+    def castling_rights(self):
+        color = WHITE if self.white_to_move() else BLACK
+        king = self.bitboards[6 * color + KING]
+        if not king:
+            return {'king_side': False, 'queen_side': False}
+        return self._castling_rights(color, king.bit_length() - 1, self._cached_attack_map())
+
+    def _castling_rights(self, color, king_pos, attacked):
+        rights = {'king_side': False, 'queen_side': False}
+        if attacked & (1 << king_pos):
+            return rights
+        if king_pos != (60 if color == WHITE else 4):
+            return rights
+        if color == WHITE:
+            king_side_flag, queen_side_flag, rook, back_rank = (
+                CASTLING_RIGHTS_KINGSIDE_WHITE, CASTLING_RIGHTS_QUEENSIDE_WHITE, 'R', 56)
+        else:
+            king_side_flag, queen_side_flag, rook, back_rank = (
+                CASTLING_RIGHTS_KINGSIDE_BLACK, CASTLING_RIGHTS_QUEENSIDE_BLACK, 'r', 0)
+        if self.board[king_side_flag]:
+            if self.board[back_rank + 7] == rook:
+                if self.board[back_rank + 5] == ' ' and self.board[back_rank + 6] == ' ':
+                    if not attacked & (0b110 << king_pos):
+                        rights['king_side'] = True
+        if self.board[queen_side_flag]:
+            if self.board[back_rank] == rook:
+                if (self.board[back_rank + 1] == ' ' and self.board[back_rank + 2] == ' ' and
+                        self.board[back_rank + 3] == ' '):
+                    if not attacked & (0b11 << (king_pos - 2)):
+                        rights['queen_side'] = True
+        return rights
+
+    def move(self, move, test=False, temp_board=None):
+        board = temp_board if temp_board is not None else self.board
+        if test:
+            start_index = self.square_to_index(move[:2])
+            end_index = self.square_to_index(move[2:4])
+            promotion_piece = move[4] if len(move) > 4 else ''
+            self._move_on_list(board, start_index, end_index, promotion_piece)
+            if board is self.board:
+                self._initialize_bitboards()
+                self.position_hash = self._hash()
+            return board
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        legal_moves = self._cached_legal_moves()
+        try:
+            encoded = self.encode_move(move)
+        except ValueError:
+            raise ValueError(f"Illegal move: {move}") from None
+        if encoded not in legal_moves or self.decode_move(encoded) != move:
+            raise ValueError(f"Illegal move: {move}")
+        self.push(encoded)
+        return board
+
+    def move_encoded(self, move):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        if move not in self._cached_legal_moves():
+            raise ValueError(f"Illegal move: {move}")
+        self.push(move)
+        return self.board
+
+    def encode_move(self, move):
+        start_index = SQUARE_INDEX.get(move[:2])
+        end_index = SQUARE_INDEX.get(move[2:4])
+        promotion_piece = move[4:]
+        if start_index is None or end_index is None or len(promotion_piece) > 1:
+            raise ValueError(f"Invalid move: {move}")
+        moving_piece = self.board[start_index]
+        flag = CAPTURE if self.board[end_index] != ' ' else QUIET_MOVE
+        if promotion_piece:
+            if promotion_piece.upper() not in PROMOTION_PIECES[WHITE]:
+                raise ValueError(f"Invalid move: {move}")
+            flag |= PROMOTION | PROMOTION_PIECES[WHITE].index(promotion_piece.upper())
+        elif moving_piece == 'P' or moving_piece == 'p':
+            if abs(start_index - end_index) == 16:
+                flag = DOUBLE_PAWN_PUSH
+            elif end_index == self._en_passant_target_index() and (start_index - end_index) % 8:
+                flag = EN_PASSANT_CAPTURE
+        elif (moving_piece == 'K' or moving_piece == 'k') and abs(start_index - end_index) == 2:
+            flag = KING_CASTLE if end_index > start_index else QUEEN_CASTLE
+        return start_index | end_index << 6 | flag << 12
+
+    def decode_move(self, move):
+        text = f'{SQUARE_NAMES[move & 63]}{SQUARE_NAMES[(move >> 6) & 63]}'
+        if move & PROMOTION_FLAG:
+            text += PROMOTION_PIECES[self.board[PLAYER_TO_MOVE] == 'b'][(move >> 12) & 3]
+        return text
+
+    def san(self, move):
+        if isinstance(move, str):
+            move = self.encode_move(move)
+        legal_moves = self._cached_legal_moves()
+        if move not in legal_moves:
+            raise ValueError(f"Illegal move: {self.decode_move(move)}")
+        board = self.board
+        start_index = move & 63
+        end_index = (move >> 6) & 63
+        flag = move >> 12
+        piece = board[start_index]
+        if flag == KING_CASTLE:
+            text = 'O-O'
+        elif flag == QUEEN_CASTLE:
+            text = 'O-O-O'
+        elif piece == 'P' or piece == 'p':
+            text = SQUARE_NAMES[start_index][0] + 'x' if flag & CAPTURE else ''
+            text += SQUARE_NAMES[end_index]
+            if flag & PROMOTION:
+                text += '=' + PROMOTION_PIECES[WHITE][flag & 3]
+        else:
+            text = piece.upper()
+            rivals = [other & 63 for other in legal_moves
+                      if other != move and (other >> 6) & 63 == end_index and board[other & 63] == piece]
+            if rivals:
+                if all(rival % 8 != start_index % 8 for rival in rivals):
+                    text += SQUARE_NAMES[start_index][0]
+                elif all(rival // 8 != start_index // 8 for rival in rivals):
+                    text += SQUARE_NAMES[start_index][1]
+                else:
+                    text += SQUARE_NAMES[start_index]
+            if flag & CAPTURE:
+                text += 'x'
+            text += SQUARE_NAMES[end_index]
+        # Made without the history so any moves after the current ply survive
+        undo = self._make_move(move)
+        if self.check():
+            text += '#' if not self._cached_legal_moves() else '+'
+        self._unmake_move(undo)
+        return text
+
+    def parse_san(self, san):
+        legal_moves = self._cached_legal_moves()
+        text = san.rstrip('+#!?')
+        if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+            flag = KING_CASTLE if len(text) == 3 else QUEEN_CASTLE
+            for move in legal_moves:
+                if move >> 12 == flag:
+                    return move
+            raise ValueError(f"Illegal move: {san}")
+        match = SAN_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"Invalid move: {san}")
+        piece_type, from_file, from_rank, destination, promotion_piece = match.groups()
+        piece = piece_type or 'P'
+        if self.board[PLAYER_TO_MOVE] == 'b':
+            piece = piece.lower()
+        end_index = SQUARE_INDEX[destination]
+        promotion = PROMOTION | PROMOTION_PIECES[WHITE].index(promotion_piece.upper()) if promotion_piece else 0
+        candidates = []
+        for move in legal_moves:
+            start_index = move & 63
+            if ((move >> 6) & 63 != end_index or self.board[start_index] != piece or
+                    (move >> 12) & PROMOTION != promotion & PROMOTION):
+                continue
+            if promotion and (move >> 12) & 3 != promotion & 3:
+                continue
+            if from_file and SQUARE_NAMES[start_index][0] != from_file:
+                continue
+            if from_rank and SQUARE_NAMES[start_index][1] != from_rank:
+                continue
+            candidates.append(move)
+        if not candidates:
+            raise ValueError(f"Illegal move: {san}")
+        if len(candidates) > 1:
+            raise ValueError(f"Ambiguous move: {san}")
+        return candidates[0]
+
+    def parse_move(self, move):
+        if COORDINATE_MOVE_PATTERN.match(move):
+            encoded = self.encode_move(move)
+            if encoded not in self._cached_legal_moves():
+                raise ValueError(f"Illegal move: {move}")
+            return encoded
+        return self.parse_san(move)
+
+    def move_san(self, san):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        self.push(self.parse_san(san))
+        return self.board
+
+    def push(self, move):
+        # Plays a move without validating it; the caller must pass a legal move.
+        # Moves past the current ply of the history are discarded.
+        if isinstance(move, str):
+            move = self.encode_move(move)
+        history = self.history
+        if history.ply < len(history):
+            history.truncate(history.ply)
+        history.append(self._make_move(move))
+        if history.ply % HISTORY_SNAPSHOT_INTERVAL == 0:
+            history.snapshots += self.to_bytes()
+        if self.board[HALF_MOVE_CLOCK] == 0:
+            # No earlier position can repeat after a pawn move or capture
+            self.position_hash_counts = {self.position_hash: 1}
+        else:
+            count = self.position_hash_counts.get(self.position_hash, 0)
+            self.position_hash_counts[self.position_hash] = count + 1
+
+    def pop(self):
+        history = self._history
+        if history is None or history.ply == 0:
+            raise IndexError("pop from empty history")
+        irreversible = self.board[HALF_MOVE_CLOCK] == 0
+        count = self.position_hash_counts.get(self.position_hash, 0)
+        if count > 1:
+            self.position_hash_counts[self.position_hash] = count - 1
+        else:
+            self.position_hash_counts.pop(self.position_hash, None)
+        undo = history.undo(history.ply - 1)
+        history.truncate(history.ply - 1)
+        history.ply -= 1
+        self._unmake_move(undo)
+        if irreversible:
+            self.position_hash_counts = self._repetition_counts()
+        return self.decode_move(undo[0])
+
+    def seek(self, ply):
+        """Moves to a ply of the history, backwards or forwards, keeping the moves after it."""
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        history = self.history
+        if not 0 <= ply <= len(history):
+            raise ValueError(f"Ply out of range: {ply}")
+        snapshot = ply - ply % HISTORY_SNAPSHOT_INTERVAL
+        if ply <= history.ply <= ply + HISTORY_SNAPSHOT_INTERVAL:
+            while history.ply > ply:
+                history.ply -= 1
+                self._unmake_move(history.undo(history.ply))
+        elif not snapshot <= history.ply <= ply:
+            initial_ply = self._initial_ply
+            self._initialize_from_record(history.snapshots, snapshot // HISTORY_SNAPSHOT_INTERVAL * POSITION_RECORD.size)
+            self._initial_ply = initial_ply
+            history.ply = snapshot
+        while history.ply < ply:
+            self._make_move(history.moves[history.ply])
+            history.ply += 1
+        self.position_hash_counts = self._repetition_counts()
+
+    def _repetition_counts(self):
+        # Counts the positions back to the last pawn move or capture, the only
+        # ones the current position can repeat
+        history = self.history
+        if history.ply == 0:
+            return dict(history.initial_counts)
+        counts = {self.position_hash: 1}
+        for ply in range(history.ply - 1, max(history.ply - self.board[HALF_MOVE_CLOCK], 0) - 1, -1):
+            if ply == 0:
+                for position_hash, count in history.initial_counts.items():
+                    counts[position_hash] = counts.get(position_hash, 0) + count
+            else:
+                position_hash = history.hashes[ply]
+                counts[position_hash] = counts.get(position_hash, 0) + 1
+        return counts
+
+    def _make_move(self, move):
+        board = self.board
+        start_index = move & 63
+        end_index = (move >> 6) & 63
+        flag = move >> 12
+        moving_piece = board[start_index]
+        target_piece = board[end_index]
+        undo = (move, target_piece, board[CASTLING_RIGHTS_KINGSIDE_WHITE:EN_PASSANT], board[EN_PASSANT],
+                board[HALF_MOVE_CLOCK], self.position_hash, self.evaluation_terms)
+        if flag == EN_PASSANT_CAPTURE:
+            self._remove_piece(end_index + 8 if moving_piece == 'P' else end_index - 8)
+        elif target_piece != ' ':
+            self._remove_piece(end_index)
+        self._remove_piece(start_index)
+        if flag & PROMOTION:
+            self._place_piece(PROMOTION_PIECES[moving_piece.islower()][flag & 3], end_index)
+        else:
+            self._place_piece(moving_piece, end_index)
+        if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            rook_start, rook_end = self._castling_rook_squares(start_index, end_index)
+            rook_piece = board[rook_start]
+            self._remove_piece(rook_start)
+            self._place_piece(rook_piece, rook_end)
+        for index in (start_index, end_index):
+            for castling_flag in CASTLING_FLAGS_BY_SQUARE.get(index, ()):
+                if board[castling_flag]:
+                    self.position_hash ^= self.zobrist_castling[castling_flag - CASTLING_RIGHTS_KINGSIDE_WHITE]
+                    board[castling_flag] = False
+        if board[EN_PASSANT] is not None:
+            previous_file = ord(board[EN_PASSANT][0]) - ord('a')
+            self.position_hash ^= self.zobrist_en_passant[previous_file]
+            board[EN_PASSANT] = None
+        if flag == DOUBLE_PAWN_PUSH:
+            board[EN_PASSANT] = SQUARE_NAMES[(start_index + end_index) // 2]
+            self.position_hash ^= self.zobrist_en_passant[start_index % 8]
+        if moving_piece == 'P' or moving_piece == 'p' or target_piece != ' ':
+            board[HALF_MOVE_CLOCK] = 0
+        else:
+            board[HALF_MOVE_CLOCK] += 1
+        board[PLAYER_TO_MOVE] = 'b' if board[PLAYER_TO_MOVE] == 'w' else 'w'
+        self.position_hash ^= self.zobrist_side
+        return undo
+
+    def _unmake_move(self, undo):
+        move, captured_piece, castling, en_passant, half_move_clock, position_hash, evaluation_terms = undo
+        board = self.board
+        start_index = move & 63
+        end_index = (move >> 6) & 63
+        flag = move >> 12
+        piece = board[end_index]
+        self._remove_piece(end_index)
+        if flag & PROMOTION:
+            piece = 'P' if piece.isupper() else 'p'
+        self._place_piece(piece, start_index)
+        if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            rook_start, rook_end = self._castling_rook_squares(start_index, end_index)
+            rook_piece = board[rook_end]
+            self._remove_piece(rook_end)
+            self._place_piece(rook_piece, rook_start)
+        if flag == EN_PASSANT_CAPTURE:
+            if piece == 'P':
+                self._place_piece('p', end_index + 8)
+            else:
+                self._place_piece('P', end_index - 8)
+        elif captured_piece != ' ':
+            self._place_piece(captured_piece, end_index)
+        board[CASTLING_RIGHTS_KINGSIDE_WHITE:EN_PASSANT] = castling
+        board[EN_PASSANT] = en_passant
+        board[HALF_MOVE_CLOCK] = half_move_clock
+        board[PLAYER_TO_MOVE] = 'b' if board[PLAYER_TO_MOVE] == 'w' else 'w'
+        self.position_hash = position_hash
+        self.evaluation_terms = evaluation_terms
+
+    def _castling_rook_squares(self, start_index, end_index):
+        if end_index > start_index:
+            return start_index + 3, start_index + 1
+        return start_index - 4, start_index - 1
+
+    def _place_piece(self, piece, index):
+        bit = 1 << index
+        piece_index = PIECE_INDEX[piece]
+        self.board[index] = piece
+        self.bitboards[piece_index] |= bit
+        self.occupancy[piece_index >= 6] |= bit
+        self.position_hash ^= self.zobrist_pieces[piece_index * 64 + index]
+        self.evaluation_terms += EVALUATION_TERMS[piece_index * 64 + index]
+
+    def _remove_piece(self, index):
+        bit = 1 << index
+        piece_index = PIECE_INDEX[self.board[index]]
+        self.board[index] = ' '
+        self.bitboards[piece_index] ^= bit
+        self.occupancy[piece_index >= 6] ^= bit
+        self.position_hash ^= self.zobrist_pieces[piece_index * 64 + index]
+        self.evaluation_terms -= EVALUATION_TERMS[piece_index * 64 + index]
+
+    def _move_on_list(self, board, start_index, end_index, promotion_piece):
+        moving_piece = board[start_index]
+        if moving_piece.upper() == 'K' and abs(start_index - end_index) == 2:
+            rook_start, rook_end = self._castling_rook_squares(start_index, end_index)
+            board[rook_end] = board[rook_start]
+            board[rook_start] = ' '
+        elif moving_piece.upper() == 'P' and board[EN_PASSANT] is not None:
+            if end_index == self.square_to_index(board[EN_PASSANT]):
+                board[end_index + 8 if moving_piece.isupper() else end_index - 8] = ' '
+        board[start_index] = ' '
+        if promotion_piece:
+            board[end_index] = promotion_piece.upper() if moving_piece.isupper() else promotion_piece.lower()
+        else:
+            board[end_index] = moving_piece
+        for index in (start_index, end_index):
+            for flag in CASTLING_FLAGS_BY_SQUARE.get(index, ()):
+                board[flag] = False
+        if moving_piece.upper() == 'P' and abs(start_index - end_index) == 16:
+            board[EN_PASSANT] = SQUARE_NAMES[(start_index + end_index) // 2]
+        else:
+            board[EN_PASSANT] = None
+        return board
+
+    def square_to_index(self, square):
+        file = ord(square[0]) - ord('a')
+        rank = 8 - int(square[1])
+        return rank * 8 + file
+
+    def index_to_square(self, index):
+        file = index % 8
+        rank = 8 - (index // 8)
+        return f'{chr(file + ord("a"))}{rank}'
+
+    def dangerous_squares(self):
+        return {SQUARE_NAMES[index] for index in bit_indices(self._cached_attack_map())}
+
+    def insufficient_material(self):
+        white_pieces = []
+        black_pieces = []
+        for index, piece in enumerate(self.board[:64]):
+            if piece == ' ' or piece.upper() == 'K':
+                continue
+            if piece.isupper():
+                white_pieces.append((piece, index))
+            else:
+                black_pieces.append((piece, index))
+        minor_pieces = ['N', 'B']
+        if not white_pieces and not black_pieces:
+            return True
+        if (len(white_pieces) == 1 and white_pieces[0][0].upper() in minor_pieces and not black_pieces) or \
+           (len(black_pieces) == 1 and black_pieces[0][0].upper() in minor_pieces and not white_pieces):
+            return True
+        if len(white_pieces) == 1 and len(black_pieces) == 1:
+            if white_pieces[0][0].upper() == 'B' and black_pieces[0][0].upper() == 'B':
+                white_square_color = (white_pieces[0][1] // 8 + white_pieces[0][1] % 8) % 2
+                black_square_color = (black_pieces[0][1] // 8 + black_pieces[0][1] % 8) % 2
+                if white_square_color == black_square_color:
+                    return True
+        return False
+
+    def fifty_move_rule(self):
+        return self.board[HALF_MOVE_CLOCK] >= 100
+
+    def stalemate(self):
+        if not self.legal_moves_encoded():
+            return not self.check()
+        return False
+
+    def three_fold_repetition(self):
+        return self.position_hash_counts.get(self.position_hash, 0) >= 3
+
+    def checkmate(self):
+        if self.check():
+            return not self.legal_moves_encoded()
+        return False
+
+    def status(self):
+        if self.checkmate():
+            return 'checkmate'
+        if self.stalemate():
+            return 'stalemate'
+        if self.insufficient_material():
+            return 'insufficient_material'
+        if self.three_fold_repetition():
+            return 'threefold'
+        if self.fifty_move_rule():
+            return 'fifty_move'
+        return 'ongoing'
+
+    def stats(self):
+        # Instrumentation counts for this board, see instrumentation_snapshot()
+        return _counter_snapshot(self._stats)
+
+    def search(self, depth=None, time_limit=None, table=None):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        if depth is None and time_limit is None:
+            depth = DEFAULT_SEARCH_DEPTH
+        if table is None:
+            if Board.transposition_table is None:
+                Board.transposition_table = TranspositionTable()
+            table = Board.transposition_table
+        return _Search(self, table, time_limit).run(min(depth or MAX_SEARCH_PLY, MAX_SEARCH_PLY))
+
+    def evaluation(self):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        return self._evaluate_terms()
+
+    def _evaluate_terms(self):
+        # Unpacks the three signed fields of evaluation_terms, lowest first,
+        # and blends the middlegame and endgame scores by the phase.
+        half = 1 << (EVALUATION_FIELD_BITS - 1)
+        mask = (1 << EVALUATION_FIELD_BITS) - 1
+        terms = self.evaluation_terms
+        middlegame = ((terms + half) & mask) - half
+        terms = (terms - middlegame) >> EVALUATION_FIELD_BITS
+        endgame = ((terms + half) & mask) - half
+        phase = min((terms - endgame) >> EVALUATION_FIELD_BITS, MAX_PHASE)
+        # Rounded towards zero so mirrored positions score as exact negatives
+        blended = middlegame * phase + endgame * (MAX_PHASE - phase)
+        return blended // MAX_PHASE if blended >= 0 else -(-blended // MAX_PHASE)
+
+    def _evaluate(self):
+        score = self._evaluate_terms()
+        return score if self.board[PLAYER_TO_MOVE] == 'w' else -score
+
+    def perft(self, depth):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        return self._perft(depth)
+
+    def _perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self._generate_legal_moves(WHITE if self.board[PLAYER_TO_MOVE] == 'w' else BLACK)
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            undo = self._make_move(move)
+            nodes += self._perft(depth - 1)
+            self._unmake_move(undo)
+        return nodes
+
+    def perft_divide(self, depth):
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        divide = {}
+        for move in self._generate_legal_moves(WHITE if self.white_to_move() else BLACK):
+            undo = self._make_move(move)
+            divide[self.decode_move(move)] = self._perft(depth - 1)
+            self._unmake_move(undo)
+        return divide
+
+    def en_passant(self):
+        return self.board[EN_PASSANT]
+
+    def probe_tablebase(self):
+        """Returns TablebaseResult(wdl, dtm) from the tables in Board.tablebases, or None.
+
+        wdl is 1, 0 or -1 for the player to move and dtm the distance to mate
+        in plies (None for a draw).
+        """
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        if self.tablebases is None:
+            return None
+        return self.tablebases.probe(self)
+
+    def polyglot_key(self):
+        """Returns the Polyglot opening book key of the position."""
+        if self.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        if self.zobrist_pieces is POLYGLOT_PIECES:
+            key = self.position_hash
+        else:
+            key = self._hash((POLYGLOT_PIECES, POLYGLOT_SIDE, POLYGLOT_CASTLING, POLYGLOT_EN_PASSANT))
+        target_index = self._en_passant_target_index()
+        if target_index >= 0:
+            color = WHITE if self.board[PLAYER_TO_MOVE] == 'w' else BLACK
+            if not PAWN_ATTACKS[color ^ 1][target_index] & self.bitboards[6 * color + PAWN]:
+                key ^= POLYGLOT_EN_PASSANT[target_index % 8]
+        return key
+
+    def _polyglot_move(self, move):
+        start_index = move & 63
+        end_index = (move >> 6) & 63
+        flag = move >> 12
+        if flag == KING_CASTLE or flag == QUEEN_CASTLE:
+            end_index = self._castling_rook_squares(start_index, end_index)[0]
+        promotion = (flag & 3) + 1 if flag & PROMOTION else 0
+        return (promotion << 12 | (7 - start_index // 8) << 9 | (start_index % 8) << 6 |
+                (7 - end_index // 8) << 3 | end_index % 8)
+
+    def _from_polyglot_move(self, book_move):
+        # The legal encoded move matching a book move, or None
+        for move in self._cached_legal_moves():
+            if self._polyglot_move(move) == book_move:
+                return move
+        return None
+
+    def _en_passant_target_index(self):
+        if self.board[EN_PASSANT] is None:
+            return -1
+        target_square = self.board[EN_PASSANT]
+        return self.square_to_index(target_square)
+
+
+class PolyglotBoard(Board):
+    """Board whose position_hash is computed from the Polyglot book keys.
+
+    position_hash includes the en passant file after every double pawn push,
+    whereas Polyglot only includes it when a pawn can take en passant;
+    polyglot_key() makes that correction without rehashing.
+    """
+
+    zobrist_pieces = POLYGLOT_PIECES
+    zobrist_side = POLYGLOT_SIDE
+    zobrist_castling = POLYGLOT_CASTLING
+    zobrist_en_passant = POLYGLOT_EN_PASSANT
+
+
+BookEntry = namedtuple('BookEntry', 'move weight learn')
+
+
+class OpeningBook:
+    """Polyglot .bin opening book, binary searched through mmap.
+
+    The file is never read into memory, so a lookup touches only the
+    log2(N) entries of its search and the entries of the position itself.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % BOOK_ENTRY.size:
+            self._file.close()
+            raise ValueError(f"Not a Polyglot book: {filename}")
+        self._length = size // BOOK_ENTRY.size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __len__(self):
+        return self._length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def raw_entries(self, key):
+        # (key, move, weight, learn) tuples of a Polyglot key, in file order
+        low, high = 0, self._length
+        while low < high:
+            middle = (low + high) // 2
+            if BOOK_ENTRY.unpack_from(self._mmap, middle * BOOK_ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self._length):
+            entry = BOOK_ENTRY.unpack_from(self._mmap, index * BOOK_ENTRY.size)
+            if entry[0] != key:
+                break
+            entries.append(entry)
+        return entries
+
+    def entries(self, board):
+        """Returns a BookEntry per book move of the board, skipping moves that are not legal."""
+        if board.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        entries = []
+        for _, book_move, weight, learn in self.raw_entries(board.polyglot_key()):
+            move = board._from_polyglot_move(book_move)
+            if move is not None:
+                entries.append(BookEntry(board.decode_move(move), weight, learn))
+        return entries
+
+    def choose(self, board, weighted=True, rng=random):
+        """Returns a book move for the board, or None when the position is not in the book.
+
+        Moves are drawn at random in proportion to their weights, or the
+        heaviest is returned with weighted=False.
+        """
+        entries = [entry for entry in self.entries(board) if entry.weight]
+        if not entries:
+            return None
+        if not weighted:
+            return max(entries, key=lambda entry: entry.weight).move
+        return rng.choices(entries, weights=[entry.weight for entry in entries])[0].move
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+def build_book(games, filename, max_ply=BOOK_MAX_PLY):
+    """Writes a Polyglot book of the first max_ply moves of the games and returns its entry count.
+
+    Games take any form validate_game accepts. Each move is weighted by the
+    results of the games it was played in (BOOK_RESULT_WEIGHTS), so moves
+    that only ever lost are left out; weights are scaled down to fit 16 bits.
+    """
+    weights = {}
+    for game in games:
+        try:
+            board, moves, result = _game_source(game, PolyglotBoard)
+        except (ValueError, KeyError, TypeError):
+            continue
+        for text in moves[:max_ply]:
+            try:
+                move = board.parse_move(text)
+            except ValueError:
+                break
+            weight = BOOK_RESULT_WEIGHTS.get(result, BOOK_RESULT_WEIGHTS['*'])[board.board[PLAYER_TO_MOVE] == 'b']
+            if weight:
+                entry_key = (board.polyglot_key(), board._polyglot_move(move))
+                weights[entry_key] = weights.get(entry_key, 0) + weight
+            board.push(move)
+    scale = max(weights.values(), default=0) / 0xFFFF
+    entries = sorted(weights.items(), key=lambda item: (item[0][0], -item[1]))
+    with open(filename, 'wb') as f:
+        for (key, book_move), weight in entries:
+            if scale > 1:
+                weight = max(int(weight / scale), 1)
+            f.write(BOOK_ENTRY.pack(key, book_move, weight, 0))
+    return len(entries)
+
+
+def _game_source(game, board_class):
+    # The starting board, moves and result of any game validate_game accepts.
+    # PGN text is only tokenized, leaving the caller to replay it once.
+    if isinstance(game, str):
+        headers, sans, result = _pgn_tokens(game)
+        board = board_class.from_fen(headers['FEN']) if 'FEN' in headers else board_class.new()
+        return board, sans, result
+    if isinstance(game, Game):
+        if game.board is None:
+            raise ValueError(game.error)
+        return board_class.from_fen(game.start_board().fen()), game.moves, game.result
+    if isinstance(game, dict):
+        board = board_class.from_fen(game['fen']) if game.get('fen') else board_class.new()
+        return board, list(game.get('moves', ())), '*'
+    return board_class.new(), list(game), '*'
+
+
+TablebaseResult = namedtuple('TablebaseResult', 'wdl dtm')
+
+
+def _material_key(white, black):
+    # The table name for the pieces of each side, given as strings of
+    # uppercase letters, and whether the colors must be swapped to use it.
+    white = ''.join(sorted(white, key=TABLEBASE_PIECE_ORDER.index))
+    black = ''.join(sorted(black, key=TABLEBASE_PIECE_ORDER.index))
+    white_strength = (len(white), [-TABLEBASE_PIECE_ORDER.index(piece) for piece in white])
+    black_strength = (len(black), [-TABLEBASE_PIECE_ORDER.index(piece) for piece in black])
+    if black_strength > white_strength:
+        return f'{black}v{white}', True
+    return f'{white}v{black}', False
+
+
+class _TablebaseLayout:
+    # Index of a position within a table: the white king's canonical square
+    # number, then the squares of the black king and the remaining pieces in
+    # table order as base-64 digits. Identical pieces are kept sorted.
+
+    def __init__(self, material):
+        white, black = material.split('v')
+        self.material = material
+        self.pieces = ['K', 'k'] + list(white[1:]) + list(black[1:].lower())
+        self.pawns = 'P' in material
+        self.king_squares = PAWN_KING_SQUARES if self.pawns else PAWNLESS_KING_SQUARES
+        self.king_slots = {square: slot for slot, square in enumerate(self.king_squares)}
+        self.symmetries = PAWN_SYMMETRIES if self.pawns else PAWNLESS_SYMMETRIES
+        self.size = len(self.king_squares) * 64 ** (len(self.pieces) - 1)
+        self.groups = []
+        start = 2
+        for end in range(3, len(self.pieces) + 1):
+            if end == len(self.pieces) or self.pieces[end] != self.pieces[start]:
+                if end - start > 1:
+                    self.groups.append((start, end))
+                start = end
+
+    def index(self, squares):
+        best = None
+        for transform in self.symmetries[squares[0]]:
+            moved = [transform[square] for square in squares]
+            for start, end in self.groups:
+                moved[start:end] = sorted(moved[start:end])
+            index = self.king_slots[moved[0]]
+            for square in moved[1:]:
+                index = index * 64 + square
+            if best is None or index < best:
+                best = index
+        return best
+
+    def squares(self, index):
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.king_squares[index])
+        squares.reverse()
+        return squares
+
+
+class Tablebases:
+    """Directory of generated endgame tables, memory-mapped on first use."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def path(self, material):
+        return os.path.join(self.directory, f'{material}.pctb')
+
+    def _table(self, material):
+        if material not in self._tables:
+            try:
+                with open(self.path(material), 'rb') as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                return None
+            layout = _TablebaseLayout(material)
+            magic, version, record_size = FILE_HEADER.unpack_from(data)
+            if (magic != TABLEBASE_FILE_MAGIC or version != FILE_FORMAT_VERSION or
+                    len(data) != FILE_HEADER.size + 2 * layout.size):
+                data.close()
+                raise ValueError(f"Not a version {FILE_FORMAT_VERSION} tablebase: {self.path(material)}")
+            self._tables[material] = (data, layout)
+        return self._tables[material]
+
+    def probe(self, board):
+        """Returns the TablebaseResult of a board, or None when no table covers it.
+
+        Positions with castling rights or a legal en passant capture are not
+        covered.
+        """
+        squares = board.board
+        if any(squares[CASTLING_RIGHTS_KINGSIDE_WHITE:EN_PASSANT]):
+            return None
+        bitboards = board.bitboards
+        if bin(board.occupancy[WHITE] | board.occupancy[BLACK]).count('1') > TABLEBASE_MAX_PIECES:
+            return None
+        white = ''.join(piece * bin(bitboards[PIECE_INDEX[piece]]).count('1') for piece in TABLEBASE_PIECE_ORDER)
+        black = ''.join(piece * bin(bitboards[PIECE_INDEX[piece.lower()]]).count('1')
+                        for piece in TABLEBASE_PIECE_ORDER)
+        if squares[EN_PASSANT] is not None and any(
+                move >> 12 == EN_PASSANT_CAPTURE for move in board._cached_legal_moves()):
+            return None
+        if white == 'K' and black == 'K':
+            return TablebaseResult(0, None)
+        material, flipped = _material_key(white, black)
+        table = self._table(material)
+        if table is None:
+            return None
+        data, layout = table
+        indices = {}
+        for piece in set(layout.pieces):
+            indices[piece] = bit_indices(bitboards[PIECE_INDEX[piece.swapcase() if flipped else piece]])
+        position = []
+        for piece in layout.pieces:
+            index = indices[piece].pop()
+            position.append(index ^ 56 if flipped else index)
+        side = (squares[PLAYER_TO_MOVE] == 'b') ^ flipped
+        value = data[FILE_HEADER.size + side * layout.size + layout.index(position)]
+        if value == TABLEBASE_INVALID:
+            return None
+        if value == 0:
+            return TablebaseResult(0, None)
+        return TablebaseResult(1 if (value - 1) % 2 else -1, value - 1)
+
+    def close(self):
+        for data, _ in self._tables.values():
+            data.close()
+        self._tables.clear()
+
+
+def generate_tablebases(materials, directory, workers=None):
+    """Builds the tables for material sets such as 'KQvK' or 'KRvKP' by retrograde analysis.
+
+    Tables the material sets reach by a capture or promotion are built
+    first, and tables already in the directory are kept. The move generation
+    pass of each table is split across a process pool. En passant captures
+    are left out of the tables. Returns the names of the tables built.
+    """
+    needed = {}
+    pending = list(materials)
+    while pending:
+        text = pending.pop()
+        white, _, black = text.upper().partition('V')
+        material = _material_key(white, black)[0]
+        if not TABLEBASE_MATERIAL_PATTERN.match(material) or len(material) - 1 > TABLEBASE_MAX_PIECES:
+            raise ValueError(f"Invalid tablebase material: {text}")
+        if material in needed or material == 'KvK':
+            continue
+        needed[material] = (len(material), material.count('P'))
+        for side, other in ((white, black), (black, white)):
+            for position, piece in enumerate(side):
+                if piece == 'K':
+                    continue
+                pending.append(_material_key(side[:position] + side[position + 1:], other)[0])
+                if piece == 'P':
+                    for promoted in 'QRBN':
+                        pending.append(_material_key(side[:position] + promoted + side[position + 1:], other)[0])
+    os.makedirs(directory, exist_ok=True)
+    built = []
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with Tablebases(directory) as tablebases:
+            for material in sorted(needed, key=lambda material: (needed[material], material)):
+                if not os.path.exists(tablebases.path(material)):
+                    _generate_tablebase(material, directory, executor, workers)
+                    built.append(material)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return built
+
+
+def _generate_tablebase(material, directory, executor, workers):
+    layout = _TablebaseLayout(material)
+    total = 2 * layout.size
+    chunk_size = -(-total // (4 * workers))
+    chunks = [(material, directory, start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    if executor is None:
+        results = [_tablebase_forward(*chunk) for chunk in chunks]
+    else:
+        results = executor.map(_tablebase_forward, *zip(*chunks))
+    values = bytearray(total)
+    remaining = bytearray(total)
+    # Bucket d holds the work for distance d: positions resolved at d, whose
+    # predecessors are updated, and children outside the table at d.
+    buckets = {}
+    for start, chunk_values, chunk_remaining, events in results:
+        values[start:start + len(chunk_values)] = chunk_values
+        remaining[start:start + len(chunk_remaining)] = chunk_remaining
+        for event in events:
+            buckets.setdefault(event >> 34, []).append(event & ((1 << 34) - 1))
+    buckets.setdefault(0, []).extend(
+        index << 2 | TABLEBASE_RESOLVED for index in range(total) if values[index] == 1 and not remaining[index])
+    distance = 0
+    while buckets:
+        items = buckets.pop(distance, [])
+        resolved = buckets.setdefault(distance + 1, [])
+        for item in items:
+            index, kind = item >> 2, item & 3
+            if kind == TABLEBASE_RESOLVED:
+                child_won = distance % 2
+                targets = _tablebase_predecessors(layout, index)
+            else:
+                child_won = kind == TABLEBASE_CHILD_WON
+                targets = (index,)
+            for target in targets:
+                if not remaining[target]:
+                    continue
+                if child_won:
+                    remaining[target] -= 1
+                    if remaining[target] > 1:
+                        continue
+                if distance + 2 >= TABLEBASE_INVALID:
+                    raise ValueError(f"Distance to mate too long to store in {material}.")
+                values[target] = distance + 2
+                remaining[target] = 0
+                resolved.append(target << 2 | TABLEBASE_RESOLVED)
+        if not resolved:
+            del buckets[distance + 1]
+        distance += 1
+    path = os.path.join(directory, f'{material}.pctb')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(FILE_HEADER.pack(TABLEBASE_FILE_MAGIC, FILE_FORMAT_VERSION, 1))
+        f.write(values)
+    os.replace(path + '.tmp', path)
+
+
+def _tablebase_forward(material, directory, start, stop):
+    # Generates the moves of each position in [start, stop) once. A position
+    # still to be resolved gets 1 + its number of distinct children inside
+    # the table in remaining, + 1 for each of: captures and promotions that
+    # win, that lose and that draw for us, so that only a position whose
+    # every move loses can count down to 1. Checkmates, stalemates and
+    # invalid indices get their final value and 0.
+    layout = _TablebaseLayout(material)
+    board = Board()
+    board.board = [' '] * 64 + ['w', False, False, False, False, None, 0]
+    board._initialize_bitboards()
+    values = bytearray(stop - start)
+    remaining = bytearray(stop - start)
+    events = []
+    placed = []
+    with Tablebases(directory) as tablebases:
+        for index in range(start, stop):
+            side, position = divmod(index, layout.size)
+            squares = layout.squares(position)
+            if (len(set(squares)) < len(squares) or layout.index(squares) != position or any(
+                    piece in 'Pp' and not 8 <= square < 56 for piece, square in zip(layout.pieces, squares))):
+                values[index - start] = TABLEBASE_INVALID
+                continue
+            for square in placed:
+                board._remove_piece(square)
+            for piece, square in zip(layout.pieces, squares):
+                board._place_piece(piece, square)
+            placed = squares
+            board.board[PLAYER_TO_MOVE] = 'b' if side else 'w'
+            if board._king_attacked(side ^ 1):
+                values[index - start] = TABLEBASE_INVALID
+                continue
+            moves = board._generate_legal_moves(side)
+            if not moves:
+                values[index - start] = 1 if board._king_attacked(side) else 0
+                continue
+            children = set()
+            lost = won = None
+            drawn = False
+            for move in moves:
+                if move & TACTICAL_FLAGS:
+                    undo = board._make_move(move)
+                    result = tablebases.probe(board)
+                    board._unmake_move(undo)
+                    if result is None:
+                        raise ValueError(f"Tablebase needed by {material} is missing.")
+                    if result.wdl < 0:
+                        lost = result.dtm if lost is None else min(lost, result.dtm)
+                    elif result.wdl > 0:
+                        won = result.dtm if won is None else max(won, result.dtm)
+                    else:
+                        drawn = True
+                else:
+                    child = list(squares)
+                    child[squares.index(move & 63)] = (move >> 6) & 63
+                    children.add(layout.index(child))
+            remaining[index - start] = 1 + len(children) + (lost is not None) + (won is not None) + drawn
+            if lost is not None:
+                events.append(lost << 34 | index << 2 | TABLEBASE_CHILD_LOST)
+            if won is not None:
+                events.append(won << 34 | index << 2 | TABLEBASE_CHILD_WON)
+    return start, values, remaining, events
+
+
+def _tablebase_predecessors(layout, index):
+    # Positions in the table that reach the position at index by a move
+    # other than a capture or promotion, found by taking back each move of
+    # the player who is not to move.
+    side, position = divmod(index, layout.size)
+    mover = side ^ 1
+    squares = layout.squares(position)
+    occupied = 0
+    for square in squares:
+        occupied |= 1 << square
+    empty = ~occupied & FULL_BOARD
+    predecessors = set()
+    for number, piece in enumerate(layout.pieces):
+        if piece.islower() != (mover == BLACK):
+            continue
+        square = squares[number]
+        piece_type = piece.upper()
+        if piece_type == 'K':
+            origins = KING_ATTACKS[square] & empty
+        elif piece_type == 'N':
+            origins = KNIGHT_ATTACKS[square] & empty
+        elif piece_type == 'B':
+            origins = bishop_attacks(square, occupied) & empty
+        elif piece_type == 'R':
+            origins = rook_attacks(square, occupied) & empty
+        elif piece_type == 'Q':
+            origins = (bishop_attacks(square, occupied) | rook_attacks(square, occupied)) & empty
+        else:
+            step = 8 if piece == 'P' else -8
+            origins = 0
+            if 8 <= square + step < 56 and empty >> (square + step) & 1:
+                origins = 1 << (square + step)
+                double_push_rank = 4 if piece == 'P' else 3
+                if square // 8 == double_push_rank and empty >> (square + 2 * step) & 1:
+                    origins |= 1 << (square + 2 * step)
+        for origin in bit_indices(origins):
+            predecessor = list(squares)
+            predecessor[number] = origin
+            predecessors.add(mover * layout.size + layout.index(predecessor))
+    return predecessors
+
+
+# Board methods timed by each instrumentation counter. Times are inclusive,
+# so a status() call also counts towards the move generation it triggers,
+# but a call made inside another method of the same counter is not counted.
+INSTRUMENTED_METHODS = {
+    'move': ('move', 'move_encoded', 'push', 'pop'),
+    'move_generation': ('_generate_legal_moves',),
+    'attack_map': ('_attack_map',),
+    'legality': ('_king_attacked', '_is_attacked', '_castling_rights'),
+    'hash_update': ('_make_move', '_unmake_move', '_hash'),
+    'status': ('check', 'checkmate', 'stalemate', 'insufficient_material', 'three_fold_repetition',
+               'fifty_move_rule', 'dangerous_squares', 'status'),
+}
+
+# Calls, seconds and a running flag per counter across all boards, and the
+# Board methods replaced while instrumentation is enabled
+_instrumentation_counters = {name: [0, 0.0, False] for name in INSTRUMENTED_METHODS}
+_uninstrumented_methods = {}
+
+
+def _timed(name, method):
+    totals = _instrumentation_counters[name]
+    perf_counter = time.perf_counter
+
+    def timed(self, *args, **kwargs):
+        if totals[2]:
+            return method(self, *args, **kwargs)
+        totals[2] = True
+        started = perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = perf_counter() - started
+            totals[2] = False
+            totals[0] += 1
+            totals[1] += elapsed
+            counters = self._stats.get(name)
+            if counters is None:
+                counters = self._stats[name] = [0, 0.0]
+            counters[0] += 1
+            counters[1] += elapsed
+
+    timed.__name__ = method.__name__
+    timed.__doc__ = method.__doc__
+    return timed
+
+
+def enable_instrumentation():
+    """Starts counting calls and wall time of the INSTRUMENTED_METHODS.
+
+    The methods are wrapped on the Board class only while instrumentation is
+    enabled, so it costs nothing when disabled.
+    """
+    if _uninstrumented_methods:
+        return
+    for name, methods in INSTRUMENTED_METHODS.items():
+        for method_name in methods:
+            method = Board.__dict__[method_name]
+            _uninstrumented_methods[method_name] = method
+            setattr(Board, method_name, _timed(name, method))
+
+
+def disable_instrumentation():
+    for method_name, method in _uninstrumented_methods.items():
+        setattr(Board, method_name, method)
+    _uninstrumented_methods.clear()
+
+
+def instrumentation_enabled():
+    return bool(_uninstrumented_methods)
+
+
+def reset_instrumentation():
+    for counters in _instrumentation_counters.values():
+        counters[0] = 0
+        counters[1] = 0.0
+
+
+def instrumentation_snapshot():
+    """Returns {counter: {'calls': n, 'time': seconds}} totalled over all boards."""
+    return _counter_snapshot(_instrumentation_counters)
+
+
+def _counter_snapshot(counters):
+    snapshot = {}
+    for name in INSTRUMENTED_METHODS:
+        calls, seconds = counters.get(name, (0, 0.0))[:2]
+        snapshot[name] = {'calls': calls, 'time': seconds}
+    return snapshot
+
+
+@contextmanager
+def instrumented():
+    """Enables instrumentation for a block and yields a dict that is filled on
+    exit with the counts accumulated inside the block, in the form returned by
+    instrumentation_snapshot().
+    """
+    was_enabled = instrumentation_enabled()
+    enable_instrumentation()
+    before = instrumentation_snapshot()
+    stats = {}
+    try:
+        yield stats
+    finally:
+        after = instrumentation_snapshot()
+        if not was_enabled:
+            disable_instrumentation()
+        for name, counters in after.items():
+            stats[name] = {'calls': counters['calls'] - before[name]['calls'],
+                           'time': counters['time'] - before[name]['time']}
+
+
+class Game:
+    """A game read from or written to PGN: tag pairs, moves and result."""
+
+    def __init__(self, headers=None, moves=None, result='*', board=None, error=None):
+        self.headers = headers if headers is not None else {}
+        self.moves = moves if moves is not None else []
+        self.result = result
+        self.board = board
+        self.error = error
+
+    @classmethod
+    def from_board(cls, board, headers=None, result=None):
+        # Decoded from the history without moving the board, the player of
+        # each move following from the parity of its ply
+        history = board._history
+        if history is None or history.ply == 0:
+            start_fen = board.fen()
+            move_strings = []
+        else:
+            start_fen = Board.from_bytes(history.snapshots[:POSITION_RECORD.size]).fen()
+            move_strings = []
+            for ply, move in enumerate(history.moves[:history.ply], board._initial_ply):
+                text = f'{SQUARE_NAMES[move & 63]}{SQUARE_NAMES[(move >> 6) & 63]}'
+                if move & PROMOTION_FLAG:
+                    text += PROMOTION_PIECES[ply % 2][(move >> 12) & 3]
+                move_strings.append(text)
+        headers = dict(headers or {})
+        if start_fen != STARTING_FEN:
+            headers.setdefault('SetUp', '1')
+            headers.setdefault('FEN', start_fen)
+        if result is None:
+            if board.checkmate():
+                result = '0-1' if board.white_to_move() else '1-0'
+            elif board.stalemate() or board.insufficient_material():
+                result = '1/2-1/2'
+            else:
+                result = '*'
+        return cls(headers, move_strings, result, board)
+
+    def start_board(self):
+        if 'FEN' in self.headers:
+            return Board.from_fen(self.headers['FEN'])
+        return Board.new()
+
+    def pgn(self):
+        headers = {tag: '?' for tag in SEVEN_TAG_ROSTER}
+        headers.update(self.headers)
+        headers['Result'] = self.result
+        lines = []
+        for tag, value in headers.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'[{tag} "{value}"]')
+        lines.append('')
+        board = self.start_board()
+        tokens = []
+        ply = board._initial_ply
+        for index, move in enumerate(self.moves):
+            if ply % 2 == 0:
+                tokens.append(f'{ply // 2 + 1}.')
+            elif index == 0:
+                tokens.append(f'{ply // 2 + 1}...')
+            encoded = board.encode_move(move)
+            tokens.append(board.san(encoded))
+            board.push(encoded)
+            ply += 1
+        tokens.append(self.result)
+        line = ''
+        for token in tokens:
+            if line and len(line) + 1 + len(token) > 79:
+                lines.append(line)
+                line = token
+            else:
+                line = f'{line} {token}' if line else token
+        lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+
+def split_pgn(source):
+    """Lazily yields the raw text of each game of a PGN filename or text file object."""
+    if isinstance(source, str):
+        with open(source, 'r') as f:
+            yield from split_pgn(f)
+        return
+    lines = []
+    in_movetext = False
+    open_comments = 0
+    for line in source:
+        if line.startswith('%'):
+            continue
+        stripped = line.strip()
+        if not open_comments and stripped.startswith('['):
+            if in_movetext:
+                yield ''.join(lines)
+                lines = []
+                in_movetext = False
+            lines.append(line)
+            continue
+        if stripped:
+            lines.append(line)
+            in_movetext = True
+            open_comments += line.count('{') - line.count('}')
+        elif in_movetext and not open_comments and PGN_RESULT_PATTERN.search(lines[-1]):
+            yield ''.join(lines)
+            lines = []
+            in_movetext = False
+    if lines:
+        yield ''.join(lines)
+
+
+def read_pgn(source, strict=True):
+    """Lazily yields a replayed Game per game of a PGN filename or text file object.
+
+    With strict=False a game with an illegal or unreadable move is yielded
+    with the legal prefix replayed and the reason in game.error instead of
+    raising ValueError.
+    """
+    for text in split_pgn(source):
+        yield parse_pgn(text, strict)
+
+
+def parse_pgn(text, strict=True):
+    headers, sans, result = _pgn_tokens(text)
+    game = Game(headers, result=result)
+    try:
+        board = game.start_board()
+    except ValueError as error:
+        if strict:
+            raise
+        game.error = str(error)
+        return game
+    game.board = board
+    for san in sans:
+        try:
+            move = board.parse_move(san)
+        except ValueError as error:
+            if strict:
+                raise ValueError(f"{error} at ply {len(game.moves) + 1}") from None
+            game.error = f"{error} at ply {len(game.moves) + 1}"
+            break
+        game.moves.append(board.decode_move(move))
+        board.push(move)
+    return game
+
+
+def _pgn_tokens(text):
+    # The tag pairs, mainline SAN moves and result of a game's PGN text,
+    # without replaying the moves
+    headers = {}
+    movetext = []
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if not movetext and stripped.startswith('['):
+            match = PGN_TAG_PATTERN.match(stripped)
+            if match:
+                headers[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+        elif stripped:
+            movetext.append(line)
+    result = headers.get('Result', '*')
+    sans = []
+    variation_depth = 0
+    for token in PGN_TOKEN_PATTERN.findall(''.join(movetext)):
+        if token == '(':
+            variation_depth += 1
+            continue
+        if token == ')':
+            variation_depth -= 1
+            continue
+        if variation_depth or token[0] in '{;$':
+            continue
+        if token in PGN_RESULTS:
+            result = token
+            break
+        san = PGN_MOVE_NUMBER_PATTERN.sub('', token)
+        if san:
+            sans.append(san)
+    return headers, sans, result
+
+
+def write_pgn(games, destination):
+    """Writes each game (a Game or a Board) as PGN to a filename or text file object."""
+    if isinstance(destination, str):
+        with open(destination, 'w') as f:
+            return write_pgn(games, f)
+    count = 0
+    for game in games:
+        if isinstance(game, Board):
+            game = Game.from_board(game)
+        destination.write(game.pgn())
+        destination.write('\n')
+        count += 1
+    return count
+
+
+# Columns of the feature array returned by position_arrays
+FEATURE_COLUMNS = ('black_to_move', 'castling_K', 'castling_Q', 'castling_k', 'castling_q',
+                   'en_passant', 'half_move_clock', 'fullmove_number')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("NumPy is required for the batch array exports.")
+
+
+def _record_dtype():
+    # Mirrors POSITION_RECORD so packed records can be viewed without copying.
+    return np.dtype([('position_hash', '<u8'), ('pieces', 'u1', (32,)), ('flags', 'u1'),
+                     ('en_passant', 'u1'), ('half_move_clock', '<u2'), ('fullmove_number', '<u2'),
+                     ('padding', 'V2')])
+
+
+def position_records(positions):
+    """Returns a structured NumPy view of packed position records without copying.
+
+    positions is a PositionStore or a bytes-like object of concatenated
+    POSITION_RECORD records. A view of a store keeps its memory map open,
+    even after the store is closed, until the view is released.
+    """
+    _require_numpy()
+    buffer = positions.records() if isinstance(positions, PositionStore) else positions
+    return np.frombuffer(buffer, dtype=_record_dtype())
+
+
+def position_arrays(positions):
+    """Returns (planes, features) NumPy arrays for a batch of positions.
+
+    planes has shape (N, 12, 8, 8) with one plane per PIECES entry, row 0
+    being rank 8; features has shape (N, 8) with the FEATURE_COLUMNS, en
+    passant given as index + 1 (0 for none). positions is a sequence of
+    Boards, or a PositionStore or bytes-like object of packed records, which
+    is decoded from a zero-copy view. A sequence of Positions is joined
+    into one buffer and decoded the same way.
+    """
+    _require_numpy()
+    if _is_record_buffer(positions):
+        return _record_arrays(position_records(positions))
+    positions = list(positions)
+    if positions and isinstance(positions[0], Position):
+        return _record_arrays(position_records(b''.join(positions)))
+    bitboards = np.array([board.bitboards for board in positions], dtype='<u8').reshape(-1, 12)
+    planes = np.unpackbits(bitboards.view(np.uint8), bitorder='little').reshape(-1, 12, 8, 8)
+    features = np.array([
+        [board.board[PLAYER_TO_MOVE] == 'b'] + board.board[CASTLING_RIGHTS_KINGSIDE_WHITE:EN_PASSANT] +
+        [SQUARE_INDEX[board.board[EN_PASSANT]] + 1 if board.board[EN_PASSANT] is not None else 0,
+         board.board[HALF_MOVE_CLOCK], board._fullmove_number()]
+        for board in positions
+    ], dtype=np.int32).reshape(-1, len(FEATURE_COLUMNS))
+    return planes, features
+
+
+def _is_record_buffer(positions):
+    return isinstance(positions, (PositionStore, bytes, bytearray, memoryview, mmap.mmap))
+
+
+def _record_move_lists(positions):
+    # Encoded legal moves per packed record, bypassing the shared cache
+    records = positions.records() if isinstance(positions, PositionStore) else memoryview(positions).cast('B')
+    board = Board()
+    move_lists = []
+    with records:
+        for offset in range(0, len(records), POSITION_RECORD.size):
+            board._initialize_from_record(records, offset)
+            move_lists.append(board._generate_legal_moves(WHITE if board.board[PLAYER_TO_MOVE] == 'w' else BLACK))
+    return move_lists
+
+
+def _record_arrays(records):
+    pieces = records['pieces']
+    codes = np.empty((len(records), 64), dtype=np.uint8)
+    codes[:, 0::2] = pieces >> 4
+    codes[:, 1::2] = pieces & 15
+    planes = (codes[:, None, :] == np.arange(1, 13, dtype=np.uint8)[None, :, None]).view(np.uint8)
+    flags = records['flags'].astype(np.int32)
+    features = np.stack([
+        flags & 1, flags >> 1 & 1, flags >> 2 & 1, flags >> 3 & 1, flags >> 4 & 1,
+        records['en_passant'].astype(np.int32), records['half_move_clock'].astype(np.int32),
+        records['fullmove_number'].astype(np.int32),
+    ], axis=1)
+    return planes.reshape(-1, 12, 8, 8), features
+
+
+def legal_move_masks(positions, dense=True):
+    """Returns the legal moves of a batch of positions as NumPy arrays.
+
+    With dense=True the result is a boolean (N, 64, 64) array indexed by
+    board, start index and end index; otherwise it is an (M, 3) int array
+    of (board, start index, end index) rows. Promotions to different pieces
+    share one entry. positions is accepted in any form position_arrays takes.
+
+    Legal moves are still generated one position at a time in Python; only
+    building the arrays from them is vectorized. Packed records are decoded
+    into a single reused Board rather than a new Board each.
+    """
+    _require_numpy()
+    if _is_record_buffer(positions):
+        move_lists = _record_move_lists(positions)
+    else:
+        move_lists = [board.legal_moves_encoded() for board in positions]
+    counts = np.fromiter((len(moves) for moves in move_lists), dtype=np.intp, count=len(move_lists))
+    moves = np.fromiter((move for moves in move_lists for move in moves), dtype=np.int32, count=int(counts.sum()))
+    rows = np.repeat(np.arange(len(move_lists)), counts)
+    if not dense:
+        return np.stack([rows, moves & 63, moves >> 6 & 63], axis=1)
+    masks = np.zeros((len(move_lists), 64, 64), dtype=bool)
+    masks[rows, moves & 63, moves >> 6 & 63] = True
+    return masks
+
+
+ValidationResult = namedtuple('ValidationResult', 'index legal plies illegal_ply error status fen')
+
+
+def validate_game(game, index=0):
+    """Replays one game and reports whether it is legal and how it ended.
+
+    A game is a PGN text, a Game, a sequence of coordinate or SAN moves from
+    the starting position, or a dict with a 'fen' and a 'moves' sequence.
+    """
+    try:
+        if isinstance(game, str):
+            game = parse_pgn(game, strict=False)
+        if isinstance(game, Game):
+            if game.board is None:
+                return ValidationResult(index, False, 0, 0, game.error, None, None)
+            board = game.board
+            plies = len(game.moves)
+            error = game.error
+        else:
+            if isinstance(game, dict):
+                board = Board.from_fen(game['fen']) if game.get('fen') else Board.new()
+                moves = game.get('moves', ())
+            else:
+                board = Board.new()
+                moves = game
+            plies = 0
+            error = None
+            for text in moves:
+                try:
+                    board.push(board.parse_move(text))
+                except ValueError as move_error:
+                    error = f"{move_error} at ply {plies + 1}"
+                    break
+                plies += 1
+    except (ValueError, KeyError, TypeError) as game_error:
+        return ValidationResult(index, False, 0, 0, str(game_error), None, None)
+    if error is not None:
+        return ValidationResult(index, False, plies, plies + 1, error, board.status(), board.fen())
+    return ValidationResult(index, True, plies, None, None, board.status(), board.fen())
+
+
+def _validate_chunk(chunk):
+    return [validate_game(game, index) for index, game in chunk]
+
+
+def validate_games(games, workers=None, chunk_size=64):
+    """Validates games across a process pool, yielding a ValidationResult per game in input order.
+
+    Games are read lazily and at most two chunks per worker are in flight,
+    so memory stays bounded however long the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(enumerate(games), chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from _validate_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_validate_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _read_move_lines(source, with_fen):
+    with open(source, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if with_fen:
+                fen, _, moves = line.partition(' moves ')
+                yield {'fen': fen, 'moves': moves.split()}
+            else:
+                yield line.split()
+
+
+IndexEntry = namedtuple('IndexEntry', 'move count')
+
+
+class PositionIndex:
+    """Sorted file of (position hash, move, count) entries, binary searched through mmap.
+
+    Written by build_position_index; like PositionStore, entry i is found
+    by offset arithmetic alone and nothing is read into memory up front.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        header = self._file.read(FILE_HEADER.size)
+        size = os.fstat(self._file.fileno()).st_size
+        if (len(header) != FILE_HEADER.size or FILE_HEADER.unpack(header) !=
+                (INDEX_FILE_MAGIC, FILE_FORMAT_VERSION, INDEX_ENTRY.size) or
+                (size - FILE_HEADER.size) % INDEX_ENTRY.size):
+            self._file.close()
+            raise ValueError(f"Not a version {FILE_FORMAT_VERSION} position index: {filename}")
+        self._length = (size - FILE_HEADER.size) // INDEX_ENTRY.size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self._length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, index):
+        # The (position hash, move, count) entry at an index
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Position index out of range.")
+        return INDEX_ENTRY.unpack_from(self._mmap, FILE_HEADER.size + index * INDEX_ENTRY.size)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+    def raw_entries(self, position_hash):
+        # (move, count) tuples of a position hash, in move order
+        low, high = 0, self._length
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle][0] < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self._length):
+            entry_hash, move, count = self[index]
+            if entry_hash != position_hash:
+                break
+            entries.append((move, count))
+        return entries
+
+    def entries(self, board):
+        """Returns an IndexEntry per move played from the board's position.
+
+        The move is None for the games that ended in the position.
+        """
+        if board.board is None:
+            raise ValueError("Engine not initialized. Call new() or load() before using this method.")
+        return [IndexEntry(None if move == INDEX_NO_MOVE else board.decode_move(move), count)
+                for move, count in self.raw_entries(board.position_hash)]
+
+    def count(self, board):
+        """Returns how many times the board's position occurred in the indexed games."""
+        return sum(count for _, count in self.entries(board))
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+def build_position_index(games, filename, workers=None, chunk_size=64, run_size=INDEX_RUN_SIZE):
+    """Writes a PositionIndex of the positions and moves of the games and returns its entry count.
+
+    Games take any form validate_game accepts and are replayed across a
+    process pool up to their first illegal move. Counts are aggregated in
+    memory up to run_size distinct entries at a time, spilled as sorted runs
+    to a temporary directory beside filename and merged, so memory stays
+    bounded however many positions the games hold.
+    """
+    workers = workers or os.cpu_count() or 1
+    run_directory = tempfile.mkdtemp(prefix='.index-', dir=os.path.dirname(os.path.abspath(filename)))
+    runs = []
+    counts = {}
+
+    def add(chunk_counts):
+        nonlocal counts
+        for key, count in chunk_counts.items():
+            counts[key] = counts.get(key, 0) + count
+        if len(counts) >= run_size:
+            runs.append(_write_index_run(counts, run_directory, len(runs)))
+            counts = {}
+
+    try:
+        chunks = _chunks(games, chunk_size)
+        if workers == 1:
+            for chunk in chunks:
+                add(_count_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(_count_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        add(pending.popleft().result())
+                while pending:
+                    add(pending.popleft().result())
+        if counts or not runs:
+            runs.append(_write_index_run(counts, run_directory, len(runs)))
+            counts = {}
+        while len(runs) > INDEX_MERGE_FAN_IN:
+            merged = []
+            for start in range(0, len(runs), INDEX_MERGE_FAN_IN):
+                path = os.path.join(run_directory, f'merge-{len(runs)}-{start}')
+                with open(path, 'wb') as f:
+                    _merge_index_runs(runs[start:start + INDEX_MERGE_FAN_IN], f)
+                merged.append(path)
+            runs = merged
+        with open(filename, 'wb') as f:
+            f.write(FILE_HEADER.pack(INDEX_FILE_MAGIC, FILE_FORMAT_VERSION, INDEX_ENTRY.size))
+            return _merge_index_runs(runs, f)
+    finally:
+        shutil.rmtree(run_directory, ignore_errors=True)
+
+
+def _count_chunk(chunk):
+    # Counts keyed by position hash << 16 | move for a chunk of games
+    counts = {}
+    for game in chunk:
+        try:
+            board, moves, _ = _game_source(game, Board)
+        except (ValueError, KeyError, TypeError):
+            continue
+        for text in moves:
+            try:
+                move = board.parse_move(text)
+            except ValueError:
+                break
+            key = board.position_hash << 16 | move
+            counts[key] = counts.get(key, 0) + 1
+            board.push(move)
+        key = board.position_hash << 16 | INDEX_NO_MOVE
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _write_index_run(counts, directory, number):
+    path = os.path.join(directory, f'run-{number}')
+    with open(path, 'wb') as f:
+        f.write(b''.join([INDEX_ENTRY.pack(key >> 16, key & 0xFFFF, min(count, INDEX_MAX_COUNT))
+                          for key, count in sorted(counts.items())]))
+    return path
+
+
+def _read_index_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(INDEX_ENTRY.size * 4096)
+            if not block:
+                return
+            yield from INDEX_ENTRY.iter_unpack(block)
+
+
+def _merge_index_runs(paths, f):
+    # Merges sorted runs into f, summing the counts of equal entries, and
+    # returns the number of entries written
+    written = 0
+    buffer = []
+    current_hash = current_move = None
+    current_count = 0
+    for position_hash, move, count in heapq.merge(*[_read_index_run(path) for path in paths]):
+        if position_hash == current_hash and move == current_move:
+            current_count += count
+            continue
+        if current_hash is not None:
+            buffer.append(INDEX_ENTRY.pack(current_hash, current_move, min(current_count, INDEX_MAX_COUNT)))
+            written += 1
+            if len(buffer) >= 4096:
+                f.write(b''.join(buffer))
+                buffer = []
+        current_hash, current_move, current_count = position_hash, move, count
+    if current_hash is not None:
+        buffer.append(INDEX_ENTRY.pack(current_hash, current_move, min(current_count, INDEX_MAX_COUNT)))
+        written += 1
+    f.write(b''.join(buffer))
+    return written
+
+
+SearchResult = namedtuple('SearchResult', 'move score pv depth nodes elapsed')
+
+
+class TranspositionTable:
+    """Fixed-size table of search results indexed by the low bits of position_hash.
+
+    An entry is replaced when the new result was searched at least as deep,
+    or when the stored one is left over from an earlier search.
+    """
+
+    def __init__(self, size=1 << 16):
+        if size < 1:
+            raise ValueError("Transposition table size must be at least 1.")
+        size = 1 << (size - 1).bit_length()
+        self._entries = [None] * size
+        self._mask = size - 1
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def probe(self, key):
+        entry = self._entries[key & self._mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        index = key & self._mask
+        entry = self._entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self._entries[index] = (key, depth, score, bound, move, self.generation)
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self._entries = [None] * len(self._entries)
+        self.generation = 0
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class _Search:
+    # Iterative deepening alpha-beta over one board, using make/unmake on the
+    # board itself. Killer moves and history scores live for one search.
+
+    def __init__(self, board, table, time_limit):
+        self.board = board
+        self.table = table
+        self.deadline = time.perf_counter() + time_limit if time_limit else None
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_SEARCH_PLY + 1)]
+        self.history = [0] * (12 * 64)
+        self.pv = [[] for _ in range(MAX_SEARCH_PLY + 2)]
+        self.path = []
+
+    def run(self, max_depth):
+        board = self.board
+        started = time.perf_counter()
+        self.table.new_search()
+        color = WHITE if board.board[PLAYER_TO_MOVE] == 'w' else BLACK
+        root_moves = board._generate_legal_moves(color)
+        if not root_moves:
+            score = -MATE_SCORE if board._king_attacked(color) else 0
+            return SearchResult(None, score, [], 0, 0, time.perf_counter() - started)
+        result = None
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._alpha_beta(depth, -INFINITE_SCORE, INFINITE_SCORE, 0)
+            except _SearchTimeout:
+                while self.path:
+                    self._unmake()
+                break
+            pv = self._pv_strings(self.pv[0])
+            elapsed = time.perf_counter() - started
+            result = SearchResult(pv[0], score, pv, depth, self.nodes, elapsed)
+            if abs(score) >= MATE_SCORE - MAX_SEARCH_PLY:
+                break
+            if self.deadline and time.perf_counter() + elapsed > self.deadline:
+                break
+        if result is None:
+            move = board.decode_move(self._ordered(root_moves, 0, 0)[0])
+            result = SearchResult(move, 0, [move], 0, self.nodes, time.perf_counter() - started)
+        return result
+
+    def _alpha_beta(self, depth, alpha, beta, ply):
+        board = self.board
+        self.nodes += 1
+        if not self.nodes & 1023 and self.deadline and time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+        self.pv[ply] = []
+        if ply:
+            if board.board[HALF_MOVE_CLOCK] >= 100 or board.position_hash_counts.get(board.position_hash, 0) > 1:
+                return 0
+        if depth <= 0 or ply >= MAX_SEARCH_PLY:
+            return self._quiescence(alpha, beta, ply)
+        key = board.position_hash
+        entry = self.table.probe(key)
+        tt_move = 0
+        if entry is not None:
+            tt_move = entry[4]
+            if ply and entry[1] >= depth:
+                score = entry[2]
+                if score > MATE_SCORE - MAX_SEARCH_PLY:
+                    score -= ply
+                elif score < MAX_SEARCH_PLY - MATE_SCORE:
+                    score += ply
+                bound = entry[3]
+                if (bound == EXACT_BOUND or (bound == LOWER_BOUND and score >= beta) or
+                        (bound == UPPER_BOUND and score <= alpha)):
+                    return score
+        color = WHITE if board.board[PLAYER_TO_MOVE] == 'w' else BLACK
+        moves = board._generate_legal_moves(color)
+        if not moves:
+            return ply - MATE_SCORE if board._king_attacked(color) else 0
+        original_alpha = alpha
+        best_score = -INFINITE_SCORE
+        best_move = 0
+        for move in self._ordered(moves, tt_move, ply):
+            self._make(move)
+            score = -self._alpha_beta(depth - 1, -beta, -alpha, ply + 1)
+            self._unmake()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if score >= beta:
+                        if not move & TACTICAL_FLAGS:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[PIECE_INDEX[board.board[move & 63]] * 64 + ((move >> 6) & 63)] += depth * depth
+                        break
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT_BOUND
+        stored_score = best_score
+        if stored_score > MATE_SCORE - MAX_SEARCH_PLY:
+            stored_score += ply
+        elif stored_score < MAX_SEARCH_PLY - MATE_SCORE:
+            stored_score -= ply
+        self.table.store(key, depth, stored_score, bound, best_move)
+        return best_score
+
+    def _quiescence(self, alpha, beta, ply):
+        board = self.board
+        self.nodes += 1
+        if not self.nodes & 1023 and self.deadline and time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+        self.pv[ply] = []
+        color = WHITE if board.board[PLAYER_TO_MOVE] == 'w' else BLACK
+        in_check = board._king_attacked(color)
+        if ply >= MAX_SEARCH_PLY:
+            return board._evaluate()
+        moves = board._generate_legal_moves(color)
+        if not moves:
+            return ply - MATE_SCORE if in_check else 0
+        if not in_check:
+            stand_pat = board._evaluate()
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            moves = [move for move in moves if move & TACTICAL_FLAGS]
+        for move in self._ordered(moves, 0, ply):
+            self._make(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            self._unmake()
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+                self.pv[ply] = [move] + self.pv[ply + 1]
+        return alpha
+
+    def _ordered(self, moves, tt_move, ply):
+        squares = self.board.board
+        killers = self.killers[ply] if ply <= MAX_SEARCH_PLY else (0, 0)
+        history = self.history
+
+        def priority(move):
+            if move == tt_move:
+                return 1 << 30
+            if move & TACTICAL_FLAGS:
+                attacker = ORDERING_VALUES[squares[move & 63]]
+                victim = ORDERING_VALUES[squares[(move >> 6) & 63]]
+                if (move >> 12) == EN_PASSANT_CAPTURE:
+                    victim = ORDERING_VALUES['P']
+                if move & PROMOTION_FLAG:
+                    victim += ORDERING_VALUES[PROMOTION_PIECES[WHITE][(move >> 12) & 3]]
+                return (1 << 20) + victim * 16 - attacker
+            if move == killers[0]:
+                return (1 << 19) + 1
+            if move == killers[1]:
+                return 1 << 19
+            return history[PIECE_INDEX[squares[move & 63]] * 64 + ((move >> 6) & 63)]
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def _make(self, move):
+        board = self.board
+        self.path.append(board._make_move(move))
+        counts = board.position_hash_counts
+        counts[board.position_hash] = counts.get(board.position_hash, 0) + 1
+
+    def _unmake(self):
+        board = self.board
+        counts = board.position_hash_counts
+        count = counts[board.position_hash]
+        if count > 1:
+            counts[board.position_hash] = count - 1
+        else:
+            del counts[board.position_hash]
+        board._unmake_move(self.path.pop())
+
+    def _pv_strings(self, pv):
+        board = self.board
+        strings = []
+        for move in pv:
+            strings.append(board.decode_move(move))
+            self._make(move)
+        for _ in pv:
+            self._unmake()
+        return strings
+
+
+def _serve_batch(items):
+    # Runs the queued game operations of a batch in a worker process. Games
+    # travel as a position record and repetition counts, both ways.
+    results = []
+    for op, record, position_hash_counts, argument in items:
+        try:
+            board = Board.from_bytes(record, position_hash_counts)
+            if op == 'move':
+                board.push(board.parse_move(argument))
+            response = {'fen': board.fen(), 'status': board.status()}
+            if op == 'legal_moves':
+                response['legal_moves'] = board.legal_moves()
+            results.append((True, board.to_bytes(), board.position_hash_counts, response))
+        except Exception as error:
+            # Caught per item so a bad request cannot fail the rest of its batch
+            results.append((False, None, None, str(error) if isinstance(error, ValueError) else repr(error)))
+    return results
+
+
+class _Session:
+    __slots__ = ('record', 'position_hash_counts', 'last_used', 'lock')
+
+    def __init__(self, record, position_hash_counts):
+        self.record = record
+        self.position_hash_counts = position_hash_counts
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class GameServer:
+    """Serves games over a line-based JSON protocol on TCP or a Unix socket.
+
+    Each request line is an object with an 'op' and, except for 'new', a
+    'game' id; an 'id' member is echoed back so requests can be pipelined.
+    Ops are 'new' (optional 'fen'), 'move' ('move' in coordinate or SAN
+    form), 'status', 'legal_moves', 'fen' and 'close'. Responses carry
+    'ok' and either the result or an 'error'.
+
+    Move, status and legal move requests are collected into batches of up to
+    batch_size, waiting at most batch_delay seconds, and run on a process
+    pool. Games idle for idle_timeout seconds, and all live games when the
+    server closes, are saved in the binary format to directory and loaded
+    back on their next request.
+    """
+
+    def __init__(self, workers=None, directory='.', idle_timeout=SERVER_IDLE_TIMEOUT,
+                 batch_size=SERVER_BATCH_SIZE, batch_delay=SERVER_BATCH_DELAY):
+        self.workers = workers or os.cpu_count() or 1
+        self.directory = directory
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.sessions = {}
+        self._executor = None
+        self._queue = None
+        self._tasks = set()
+        self._writers = set()
+        self._server = None
+
+    def path(self, game):
+        return os.path.join(self.directory, f'{game}.pclg')
+
+    async def start(self, host='127.0.0.1', port=SERVER_PORT, path=None):
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._queue = asyncio.Queue()
+        # Two batches in flight keep the pool busy while the next one fills
+        self._batch_slots = asyncio.Semaphore(2)
+        for coroutine in (self._batcher(), self._evictor()):
+            self._spawn(coroutine)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._connection, path)
+        else:
+            self._server = await asyncio.start_server(self._connection, host, port)
+        return self._server
+
+    async def serve_forever(self, host='127.0.0.1', port=SERVER_PORT, path=None):
+        server = await self.start(host, port, path)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        # Live games are saved like idle ones, once their in-flight requests
+        # finish, so they survive a restart
+        for game, session in list(self.sessions.items()):
+            async with session.lock:
+                if session.record is not None:
+                    await self._evict(game, session)
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def handle(self, request):
+        """Returns the response object to one request object."""
+        response = {'id': request['id']} if isinstance(request, dict) and 'id' in request else {}
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object.")
+            response.update(await self._handle(request.get('op'), request))
+            response['ok'] = True
+        except ValueError as error:
+            response['ok'] = False
+            response['error'] = str(error)
+        except Exception as error:
+            response['ok'] = False
+            response['error'] = f"Internal error: {error!r}"
+        return response
+
+    async def _handle(self, op, request):
+        if op == 'new':
+            fen = request.get('fen')
+            board = Board.from_fen(fen) if fen else Board.new()
+            game = uuid.uuid4().hex
+            self.sessions[game] = _Session(board.to_bytes(), board.position_hash_counts)
+            return {'game': game, 'fen': board.fen()}
+        game = request.get('game')
+        if not isinstance(game, str) or not SERVER_GAME_PATTERN.match(game):
+            raise ValueError(f"Unknown game: {game}")
+        session = self.sessions.get(game)
+        if session is None:
+            if not os.path.exists(self.path(game)):
+                raise ValueError(f"Unknown game: {game}")
+            session = self.sessions.setdefault(game, _Session(None, None))
+        async with session.lock:
+            session.last_used = time.monotonic()
+            if session.record is None:
+                await self._restore(game, session)
+            if op == 'fen':
+                return {'game': game, 'fen': Board.from_bytes(session.record).fen()}
+            if op == 'close':
+                del self.sessions[game]
+                return {'game': game}
+            if op not in ('move', 'status', 'legal_moves'):
+                raise ValueError(f"Unknown op: {op}")
+            if op == 'move' and not isinstance(request.get('move'), str):
+                raise ValueError("Move must be a string.")
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((session, op, request.get('move'), future))
+            ok, record, position_hash_counts, result = await future
+            if not ok:
+                raise ValueError(result)
+            session.record = record
+            session.position_hash_counts = position_hash_counts
+            session.last_used = time.monotonic()
+            result['game'] = game
+            return result
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._batch_slots.acquire()
+            self._spawn(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        # A session has at most one request in a batch, since requests hold
+        # the session lock until their result arrives.
+        loop = asyncio.get_running_loop()
+        try:
+            size = -(-len(batch) // self.workers)
+            chunks = [batch[start:start + size] for start in range(0, len(batch), size)]
+            results = await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _serve_batch, [
+                    (op, session.record, session.position_hash_counts, argument)
+                    for session, op, argument, _ in chunk
+                ]) for chunk in chunks
+            ))
+            for chunk, chunk_results in zip(chunks, results):
+                for (_, _, _, future), result in zip(chunk, chunk_results):
+                    if not future.done():
+                        future.set_result(result)
+        except Exception as error:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self._batch_slots.release()
+
+    async def _evictor(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout / 2, SERVER_EVICTION_INTERVAL))
+            cutoff = time.monotonic() - self.idle_timeout
+            for game, session in list(self.sessions.items()):
+                if session.record is not None and session.last_used < cutoff and not session.lock.locked():
+                    async with session.lock:
+                        if session.record is not None and session.last_used < cutoff:
+                            await self._evict(game, session)
+
+    async def _evict(self, game, session):
+        board = Board.from_bytes(session.record, session.position_hash_counts)
+        await asyncio.get_running_loop().run_in_executor(None, board.save, self.path(game))
+        session.record = None
+        session.position_hash_counts = None
+
+    async def _restore(self, game, session):
+        loop = asyncio.get_running_loop()
+        board = await loop.run_in_executor(None, Board.load, self.path(game))
+        await loop.run_in_executor(None, os.remove, self.path(game))
+        session.record = board.to_bytes()
+        session.position_hash_counts = board.position_hash_counts
+
+    async def _connection(self, reader, writer):
+        pending = set()
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(self._respond(line, writer))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, line, writer):
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            response = {'ok': False, 'error': "Invalid JSON."}
+        else:
+            response = await self.handle(request)
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+# Reference positions with known perft node counts, keyed by depth
+PERFT_POSITIONS = [
+    ('start', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ('en_passant', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('promotion', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ('castling', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+PERFT_DEFAULT_DEPTHS = {'start': 4, 'kiwipete': 3, 'en_passant': 4, 'promotion': 3, 'castling': 3, 'middlegame': 3}
+
+
+def run_perft_benchmark(depth=None, positions=None, divide=False, out=sys.stdout):
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected_counts in PERFT_POSITIONS:
+        if positions and name not in positions:
+            continue
+        board = Board.from_fen(fen)
+        position_depth = min(depth, max(expected_counts)) if depth else PERFT_DEFAULT_DEPTHS[name]
+        state = (board.board.copy(), board.position_hash)
+        started = time.perf_counter()
+        if divide:
+            counts = board.perft_divide(position_depth)
+            nodes = sum(counts.values())
+        else:
+            nodes = board.perft(position_depth)
+        elapsed = time.perf_counter() - started
+        expected = expected_counts[position_depth]
+        ok = nodes == expected and (board.board, board.position_hash) == state and board.position_hash == board._hash()
+        failures += not ok
+        total_nodes += nodes
+        total_time += elapsed
+        if divide:
+            for move, count in sorted(counts.items()):
+                print(f'  {move}: {count}', file=out)
+        nodes_per_second = nodes / elapsed if elapsed else 0
+        print(f'{name:<12} depth {position_depth}  nodes {nodes:>9}  expected {expected:>9}  '
+              f'{elapsed:8.3f}s  {nodes_per_second:>10.0f} nps  {"ok" if ok else "FAIL"}', file=out)
+    if total_time:
+        print(f'{"total":<12} nodes {total_nodes}  {total_time:.3f}s  {total_nodes / total_time:.0f} nps', file=out)
+    return failures == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pychess_lite')
+    commands = parser.add_subparsers(dest='command', required=True)
+    bench = commands.add_parser('perft', help='run the perft benchmark on the reference positions')
+    bench.add_argument('--depth', type=int, help='search depth, capped at the deepest known count')
+    bench.add_argument('--position', action='append', dest='positions',
+                       choices=[name for name, _, _ in PERFT_POSITIONS], help='only run the named position')
+    bench.add_argument('--divide', action='store_true', help='print per-move node counts')
+    validate = commands.add_parser('validate', help='validate a file of games across a process pool')
+    validate.add_argument('source', help='a PGN file, or one game per line for the moves and fen formats')
+    validate.add_argument('--format', choices=['pgn', 'moves', 'fen'], default='pgn',
+                          help="pgn, 'moves' (space-separated moves per line) or 'fen' ('<fen> moves ...' per line)")
+    validate.add_argument('--workers', type=int, help='worker processes, defaults to the CPU count')
+    validate.add_argument('--chunk-size', type=int, default=64, help='games sent to a worker at a time')
+    book = commands.add_parser('book', help='build a Polyglot opening book from a file of games')
+    book.add_argument('source', help='a PGN file, or one game per line for the moves and fen formats')
+    book.add_argument('output', help='the .bin book to write')
+    book.add_argument('--format', choices=['pgn', 'moves', 'fen'], default='pgn',
+                      help="pgn, 'moves' (space-separated moves per line) or 'fen' ('<fen> moves ...' per line)")
+    book.add_argument('--max-ply', type=int, default=BOOK_MAX_PLY, help='plies of each game to include')
+    index = commands.add_parser('index', help='count the positions and moves of a file of games')
+    index.add_argument('source', help='a PGN file, or one game per line for the moves and fen formats')
+    index.add_argument('output', help='the position index to write')
+    index.add_argument('--format', choices=['pgn', 'moves', 'fen'], default='pgn',
+                       help="pgn, 'moves' (space-separated moves per line) or 'fen' ('<fen> moves ...' per line)")
+    index.add_argument('--workers', type=int, help='worker processes, defaults to the CPU count')
+    index.add_argument('--chunk-size', type=int, default=64, help='games sent to a worker at a time')
+    index.add_argument('--run-size', type=int, default=INDEX_RUN_SIZE,
+                       help='distinct entries held in memory before spilling to disk')
+    tablebase = commands.add_parser('tablebase', help='generate endgame tablebases by retrograde analysis')
+    tablebase.add_argument('materials', nargs='+', help="material sets of up to four pieces, such as KQvK or KRvKP")
+    tablebase.add_argument('--directory', default='.', help='where the .pctb tables are written')
+    tablebase.add_argument('--workers', type=int, help='worker processes, defaults to the CPU count')
+    serve = commands.add_parser('serve', help='serve games over a line-based JSON protocol')
+    serve.add_argument('--host', default='127.0.0.1', help='TCP address to listen on')
+    serve.add_argument('--port', type=int, default=SERVER_PORT, help='TCP port to listen on')
+    serve.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    serve.add_argument('--workers', type=int, help='worker processes, defaults to the CPU count')
+    serve.add_argument('--directory', default='.', help='where idle games are saved')
+    serve.add_argument('--idle-timeout', type=float, default=SERVER_IDLE_TIMEOUT,
+                       help='seconds before an idle game is saved to disk')
+    args = parser.parse_args(argv)
+    if args.command == 'perft':
+        return 0 if run_perft_benchmark(args.depth, args.positions, args.divide) else 1
+    if args.command == 'validate':
+        if args.format == 'pgn':
+            games = split_pgn(args.source)
+        else:
+            games = _read_move_lines(args.source, args.format == 'fen')
+        illegal = 0
+        for result in validate_games(games, args.workers, args.chunk_size):
+            illegal += not result.legal
+            verdict = 'legal' if result.legal else f'illegal at ply {result.illegal_ply}'
+            print(f'{result.index}\t{verdict}\t{result.plies}\t{result.status}\t{result.error or ""}')
+        return 1 if illegal else 0
+    if args.command == 'book':
+        if args.format == 'pgn':
+            games = split_pgn(args.source)
+        else:
+            games = _read_move_lines(args.source, args.format == 'fen')
+        print(f'{build_book(games, args.output, args.max_ply)} entries written to {args.output}')
+        return 0
+    if args.command == 'index':
+        if args.format == 'pgn':
+            games = split_pgn(args.source)
+        else:
+            games = _read_move_lines(args.source, args.format == 'fen')
+        entries = build_position_index(games, args.output, args.workers, args.chunk_size, args.run_size)
+        print(f'{entries} entries written to {args.output}')
+        return 0
+    if args.command == 'serve':
+        server = GameServer(args.workers, args.directory, args.idle_timeout)
+        try:
+            asyncio.run(server.serve_forever(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == 'tablebase':
+        for material in generate_tablebases(args.materials, args.directory, args.workers):
+            print(f'{material} written to {os.path.join(args.directory, material)}.pctb')
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+from pychess_lite import Board, OpeningBook, build_book
+
+GAMES = [
+    ['e2e4', 'e7e5', 'g1f3', 'b8c6'],
+    ['e2e4', 'c7c5', 'g1f3'],
+    ['d2d4', 'd7d5'],
+]
+PGN = [
+    '[Event "?"]\n[Result "1-0"]\n\n1. e4 e5 2. Nf3 Nc6 1-0\n',
+    '[Event "?"]\n[Result "*"]\n\n1. e4 c5 2. Nf3 *\n',
+    '[Event "?"]\n[Result "*"]\n\n1. d4 {a comment} d5 (1... Nf6) *\n',
+]
+
+
+def test_pgn_and_move_lists_give_the_same_book(tmp_path):
+    build_book(PGN, str(tmp_path / 'pgn.bin'))
+    build_book(GAMES, str(tmp_path / 'moves.bin'))
+    with OpeningBook(str(tmp_path / 'pgn.bin')) as from_pgn, OpeningBook(str(tmp_path / 'moves.bin')) as from_moves:
+        board = Board.new()
+        assert {entry.move for entry in from_pgn.entries(board)} == {'e2e4', 'd2d4'}
+        assert {entry.move for entry in from_moves.entries(board)} == {'e2e4', 'd2d4'}
+        # The win gives 1. e4 more weight than the unfinished games
+        weights = {entry.move: entry.weight for entry in from_pgn.entries(board)}
+        assert weights['e2e4'] > weights['d2d4']
+        # Black's moves from the game Black lost are left out
+        board.move('e2e4')
+        assert {entry.move for entry in from_pgn.entries(board)} == {'c7c5'}
+        assert {entry.move for entry in from_moves.entries(board)} == {'e7e5', 'c7c5'}
@@ -0,0 +1,35 @@
+import random
+
+from pychess_lite import Board
+
+
+def mirror(fen):
+    placement, player, castling, en_passant, *clocks = fen.split()
+    placement = '/'.join(reversed(placement.split('/'))).swapcase()
+    castling = ''.join(sorted(castling.swapcase(), key='KQkq-'.index))
+    en_passant = en_passant if en_passant == '-' else en_passant[0] + ('6' if en_passant[1] == '3' else '3')
+    return ' '.join([placement, 'b' if player == 'w' else 'w', castling, en_passant] + clocks)
+
+
+def test_mirrored_positions_score_as_negatives():
+    rng = random.Random(7)
+    for _ in range(50):
+        board = Board.new()
+        for _ in range(rng.randint(0, 40)):
+            moves = board.legal_moves_encoded()
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            mirrored = Board.from_fen(mirror(board.fen()))
+            assert mirrored.evaluation() == -board.evaluation()
+
+
+def test_incremental_evaluation_matches_a_fresh_board():
+    rng = random.Random(11)
+    board = Board.new()
+    for _ in range(80):
+        moves = board.legal_moves_encoded()
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+        assert board.evaluation() == Board.from_fen(board.fen()).evaluation()
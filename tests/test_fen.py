@@ -0,0 +1,34 @@
+import pytest
+
+from pychess_lite import Board
+
+
+@pytest.mark.parametrize('fen', [
+    # En passant square with no enemy pawn just past it
+    '4k3/8/8/4P3/8/8/8/4K3 w - d6 0 1',
+    # En passant square on the mover's own side
+    '4k3/8/8/8/8/8/4P3/4K3 w - d3 0 1',
+    '4k3/8/8/8/3p4/8/8/4K3 w - d3 0 1',
+    # En passant square that is occupied
+    '4k3/3p4/3p4/3p4/8/8/8/4K3 w - d6 0 1',
+    # Castling letters without the king or rook on its home square
+    '4k3/8/8/8/8/8/8/3K3R w K - 0 1',
+    '4k3/8/8/8/8/8/8/4K3 w Q - 0 1',
+    'r3k3/8/8/8/8/8/8/4K3 w k - 0 1',
+    '1r2k3/8/8/8/8/8/8/4K3 w q - 0 1',
+])
+def test_inconsistent_fields_are_rejected(fen):
+    with pytest.raises(ValueError):
+        Board.from_fen(fen)
+
+
+@pytest.mark.parametrize('fen', [
+    'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1',
+    'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/8/8/8/8/8/8/K6k b - - 12 40',
+])
+def test_fen_round_trip(fen):
+    board = Board.from_fen(fen)
+    assert board.fen() == fen
+    assert Board.from_fen(board.fen()).position_hash == board.position_hash
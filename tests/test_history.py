@@ -0,0 +1,33 @@
+import pytest
+
+from pychess_lite import Board
+
+
+def test_san_after_seek_keeps_later_moves():
+    board = Board.new()
+    for move in ('e2e4', 'e7e5', 'g1f3', 'b8c6'):
+        board.move(move)
+    fen = board.fen()
+    board.seek(1)
+    assert board.san('e7e5') == 'e5'
+    assert len(board.history) == 4
+    board.seek(4)
+    assert board.fen() == fen
+
+
+def test_fen_clocks_outside_the_record_are_rejected():
+    for fen in ('4k3/8/8/8/8/8/8/4K3 w - - -3 1', '4k3/8/8/8/8/8/8/4K3 w - - 70000 1',
+                '4k3/8/8/8/8/8/8/4K3 w - - 0 70000'):
+        with pytest.raises(ValueError):
+            Board.from_fen(fen)
+
+
+def test_history_starts_at_the_loaded_position():
+    fen = 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 4 10'
+    board = Board.from_fen(fen)
+    board.push('e1g1')
+    board.push('e8c8')
+    assert board.fen().endswith(' 6 11')
+    board.seek(0)
+    assert board.fen() == fen
+    assert board.history.initial_counts == {board.position_hash: 1}
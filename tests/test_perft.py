@@ -0,0 +1,19 @@
+import pytest
+
+from pychess_lite import PERFT_DEFAULT_DEPTHS, PERFT_POSITIONS, Board
+
+
+@pytest.mark.parametrize('name, fen, counts', PERFT_POSITIONS, ids=[name for name, _, _ in PERFT_POSITIONS])
+def test_reference_counts(name, fen, counts):
+    board = Board.from_fen(fen)
+    depth = PERFT_DEFAULT_DEPTHS[name]
+    assert board.perft(depth) == counts[depth]
+    assert board.fen() == fen
+    assert board.position_hash == Board.from_fen(fen).position_hash
+
+
+def test_divide_adds_up():
+    board = Board.new()
+    divide = board.perft_divide(3)
+    assert len(divide) == 20
+    assert sum(divide.values()) == 8902
@@ -0,0 +1,39 @@
+from pychess_lite import Board, Game, parse_pgn
+
+PGN = '''[Event "?"]
+[Site "?"]
+[Date "?"]
+[Round "?"]
+[White "?"]
+[Black "?"]
+[Result "1-0"]
+
+1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7# 1-0
+'''
+
+
+def test_pgn_round_trip():
+    game = parse_pgn(PGN)
+    assert game.moves == ['e2e4', 'e7e5', 'f1c4', 'b8c6', 'd1h5', 'g8f6', 'h5f7']
+    assert game.board.checkmate()
+    assert game.pgn() == PGN
+    assert Game.from_board(game.board).pgn() == PGN
+
+
+def test_san_round_trip():
+    board = Board.from_fen('r3k2r/1P6/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    for move in board.legal_moves():
+        san = board.san(move)
+        assert board.decode_move(board.parse_san(san)) == move
+
+
+def test_from_board_leaves_the_board_alone():
+    board = Board.from_fen('4k3/1P6/8/8/8/8/6p1/4K3 w - - 0 30')
+    for move in ('b7b8Q', 'g2g1n', 'e1d2', 'e8e7'):
+        board.push(move)
+    board.seek(3)
+    fen = board.fen()
+    game = Game.from_board(board)
+    assert game.moves == ['b7b8Q', 'g2g1n', 'e1d2']
+    assert game.headers['FEN'] == '4k3/1P6/8/8/8/8/6p1/4K3 w - - 0 30'
+    assert board.fen() == fen and len(board.history) == 4
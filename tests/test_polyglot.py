@@ -0,0 +1,35 @@
+import pytest
+
+from pychess_lite import Board, PolyglotBoard
+
+# Keys given in the Polyglot book format specification
+KEYS = [
+    ([], 0x463B96181691FC9C),
+    (['e2e4'], 0x823C9B50FD114196),
+    (['e2e4', 'd7d5'], 0x0756B94461C50FB0),
+    (['e2e4', 'd7d5', 'e4e5'], 0x662FAFB965DB29D4),
+    (['e2e4', 'd7d5', 'e4e5', 'f7f5'], 0x22A48B5A8E47FF78),
+    (['e2e4', 'd7d5', 'e4e5', 'f7f5', 'e1e2'], 0x652A607CA3F242C1),
+    (['e2e4', 'd7d5', 'e4e5', 'f7f5', 'e1e2', 'e8f7'], 0x00FDD303C946BDD9),
+    (['a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4'], 0x3C8123EA7B067637),
+    (['a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4', 'b4c3', 'a1a3'], 0x5C3F9B829B279560),
+]
+
+
+@pytest.mark.parametrize('moves, key', KEYS)
+def test_specification_keys(moves, key):
+    board = Board.new()
+    polyglot_board = PolyglotBoard.new()
+    for move in moves:
+        board.move(move)
+        polyglot_board.move(move)
+    assert board.polyglot_key() == key
+    assert polyglot_board.polyglot_key() == key
+    assert polyglot_board.position_hash == polyglot_board._hash()
+
+
+def test_keys_survive_a_fen_round_trip():
+    board = PolyglotBoard.new()
+    for move in ('e2e4', 'd7d5', 'e4e5', 'f7f5'):
+        board.move(move)
+    assert PolyglotBoard.from_fen(board.fen()).polyglot_key() == board.polyglot_key()
@@ -0,0 +1,22 @@
+import pickle
+
+from pychess_lite import Board, Position
+
+
+def test_transposition_is_the_same_position():
+    board = Board.new()
+    for move in ('g1f3', 'g8f6', 'f3g1', 'f6g8'):
+        board.move(move)
+    start = Board.new().position()
+    assert board.position() == start
+    assert len({board.position(), start}) == 1
+
+
+def test_record_bytes_are_not_a_position():
+    position = Board.new().position()
+    record = bytes(position)
+    assert Position(record) == position
+    assert position != record and record != position
+    assert not position == record and not record == position
+    assert len({position, record}) == 2
+    assert pickle.loads(pickle.dumps(position)) == position
@@ -0,0 +1,58 @@
+import asyncio
+
+from pychess_lite import Board, GameServer, _serve_batch
+
+
+def test_bad_item_does_not_fail_its_batch():
+    record = Board.new().to_bytes()
+    results = _serve_batch([('move', record, {}, None), ('move', record, {}, 'e2e4')])
+    assert results[0][0] is False
+    assert results[1][0] is True
+    assert results[1][3]['fen'] == 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+
+
+def test_bad_and_good_move_in_one_batch(tmp_path):
+    async def run():
+        server = GameServer(workers=1, directory=str(tmp_path), batch_delay=0.05)
+        await server.start(port=0)
+        try:
+            first = (await server.handle({'op': 'new'}))['game']
+            second = (await server.handle({'op': 'new'}))['game']
+            return await asyncio.gather(
+                server.handle({'id': 1, 'op': 'move', 'game': first}),
+                server.handle({'id': 2, 'op': 'move', 'game': second, 'move': 'e2e4'}),
+                server.handle({'id': 3, 'op': 'move', 'game': first, 'move': 5}),
+            )
+        finally:
+            await server.close()
+
+    missing, good, wrong_type = asyncio.run(run())
+    assert missing == {'id': 1, 'ok': False, 'error': 'Move must be a string.'}
+    assert good['ok'] and good['id'] == 2
+    assert good['fen'].startswith('rnbqkbnr/pppppppp/8/8/4P3/')
+    assert wrong_type['ok'] is False
+
+
+def test_live_games_are_saved_on_close(tmp_path):
+    async def play():
+        server = GameServer(workers=1, directory=str(tmp_path))
+        await server.start(port=0)
+        try:
+            game = (await server.handle({'op': 'new'}))['game']
+            await server.handle({'op': 'move', 'game': game, 'move': 'e2e4'})
+            return game
+        finally:
+            await server.close()
+
+    async def resume(game):
+        server = GameServer(workers=1, directory=str(tmp_path))
+        await server.start(port=0)
+        try:
+            return await server.handle({'op': 'fen', 'game': game})
+        finally:
+            await server.close()
+
+    game = asyncio.run(play())
+    assert (tmp_path / f'{game}.pclg').exists()
+    response = asyncio.run(resume(game))
+    assert response['ok'] and response['fen'].startswith('rnbqkbnr/pppppppp/8/8/4P3/')
@@ -0,0 +1,14 @@
+from pychess_lite import Board, PositionStore
+
+
+def test_reads_after_append_with_records_still_referenced(tmp_path):
+    board = Board.new()
+    with PositionStore(str(tmp_path / 'positions.pcls')) as store:
+        store.append(board)
+        record = store[0]
+        view = store.records()
+        board.move('e2e4')
+        store.append(board)
+        assert store[1] == board.to_bytes()
+        assert record == bytes(view)
+        view.release()
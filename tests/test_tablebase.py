@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from pychess_lite import Board, Tablebases, TablebaseResult, generate_tablebases
+
+
+@pytest.fixture(scope='module')
+def tablebases(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tables'))
+    generate_tablebases(['KRvK'], directory, workers=1)
+    with Tablebases(directory) as tables:
+        yield tables
+
+
+def probe(tables, fen):
+    board = Board.from_fen(fen)
+    return board, tables.probe(board)
+
+
+def test_known_results(tablebases):
+    board, result = probe(tablebases, 'R6k/8/6K1/8/8/8/8/8 b - - 0 1')
+    assert board.checkmate() and result == TablebaseResult(-1, 0)
+    board, result = probe(tablebases, 'k7/8/K7/8/8/8/8/1R6 b - - 0 1')
+    assert board.stalemate() and result == TablebaseResult(0, None)
+    _, result = probe(tablebases, 'k7/8/1K6/8/8/8/8/7R w - - 0 1')
+    assert result == TablebaseResult(1, 1)
+    assert tablebases.probe(Board.new()) is None
+
+
+def test_probes_agree_with_one_ply_search(tablebases):
+    rng = random.Random(5)
+    checked = 0
+    while checked < 200:
+        squares = rng.sample(range(64), 3)
+        king, _, enemy_king = squares
+        if abs(king // 8 - enemy_king // 8) <= 1 and abs(king % 8 - enemy_king % 8) <= 1:
+            continue
+        board = [' '] * 64
+        for square, piece in zip(squares, 'KRk'):
+            board[square] = piece
+        rows = [''.join(board[row * 8:row * 8 + 8]) for row in range(8)]
+        placement = '/'.join(row.replace(' ', '1') for row in rows)
+        player = rng.choice('wb')
+        board = Board.from_fen(f'{placement} {player} - - 0 1')
+        # The player who just moved must not be left in check
+        if Board.from_fen(f'{placement} {"b" if player == "w" else "w"} - - 0 1').check():
+            continue
+        result = tablebases.probe(board)
+        assert result is not None, board.fen()
+        if board.checkmate():
+            assert result == TablebaseResult(-1, 0)
+        elif board.stalemate() or board.insufficient_material():
+            assert result.wdl == 0
+        else:
+            children = []
+            for move in board.legal_moves_encoded():
+                board.push(move)
+                child = tablebases.probe(board)
+                children.append(child if child is not None else TablebaseResult(0, None))
+                board.pop()
+            best = max(-child.wdl for child in children)
+            assert result.wdl == best
+            if best == 1:
+                assert result.dtm == 1 + min(child.dtm for child in children if child.wdl == -1)
+            elif best == -1:
+                assert result.dtm == 1 + max(child.dtm for child in children)
+        checked += 1